@@ -0,0 +1,90 @@
+import binascii
+import uuid
+from base64 import b64decode
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from PIL import Image, UnidentifiedImageError
+from rest_framework.fields import FileField, ImageField
+
+BASE64_MARKER = ';base64,'
+# Кратно 4, чтобы каждый кусок декодировался отдельно.
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+class Base64ImageField(ImageField):
+    """Изображение в base64 с потоковым декодированием.
+
+    Строка декодируется кусками во временный файл, который остаётся в
+    памяти до FILE_UPLOAD_MAX_MEMORY_SIZE и дальше уходит на диск.
+    Слишком большие данные отклоняются до декодирования, формат и
+    размеры проверяются по заголовку изображения. Проверка Django
+    ImageField не используется: она копирует файл целиком в BytesIO.
+    """
+
+    ALLOWED_FORMATS = {
+        'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp',
+    }
+    default_error_messages = {
+        'not_base64': 'Изображение должно быть строкой в base64.',
+        'invalid_base64': 'Не удалось декодировать изображение.',
+        'too_large': 'Размер изображения больше {max_size} байт.',
+        'invalid_format': 'Неподдерживаемый формат изображения.',
+        'too_large_side': 'Изображение больше {max_side} px по стороне.',
+    }
+
+    def to_internal_value(self, data: str) -> InMemoryUploadedFile:
+        if not isinstance(data, str):
+            self.fail('not_base64')
+        marker = data.find(BASE64_MARKER)
+        start = 0 if marker == -1 else marker + len(BASE64_MARKER)
+        max_size = settings.MAX_IMAGE_UPLOAD_SIZE
+        if (len(data) - start) * 3 // 4 > max_size:
+            self.fail('too_large', max_size=max_size)
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        try:
+            for position in range(start, len(data), DECODE_CHUNK_SIZE):
+                file.write(b64decode(
+                    data[position:position + DECODE_CHUNK_SIZE],
+                    validate=True,
+                ))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_base64')
+        size = file.tell()
+        file.seek(0)
+        image_format = self._check_header(file)
+        file.seek(0)
+        upload = InMemoryUploadedFile(
+            file=file,
+            field_name=self.field_name,
+            name=f'{uuid.uuid4()}.{self.ALLOWED_FORMATS[image_format]}',
+            content_type=Image.MIME[image_format],
+            size=size,
+            charset=None,
+        )
+        return FileField.to_internal_value(self, upload)
+
+    def _check_header(self, file: SpooledTemporaryFile) -> str:
+        """Формат и размеры из заголовка, без декодирования пикселей."""
+        try:
+            image = Image.open(file)
+        except (UnidentifiedImageError, OSError):
+            file.close()
+            self.fail('invalid_format')
+        if image.format not in self.ALLOWED_FORMATS:
+            file.close()
+            self.fail('invalid_format')
+        max_side = settings.MAX_IMAGE_SIDE
+        if max(image.size) > max_side:
+            file.close()
+            self.fail('too_large_side', max_side=max_side)
+        try:
+            image.verify()
+        except Exception:
+            file.close()
+            self.fail('invalid_format')
+        return image.format
@@ -1,39 +1,109 @@
+from django.db.models import Exists, OuterRef, QuerySet
 from django_filters.rest_framework import (
-    AllValuesMultipleFilter, BooleanFilter, FilterSet,
+    BaseInFilter, BooleanFilter, CharFilter, ChoiceFilter, FilterSet,
+    NumberFilter,
 )
+from django_filters.widgets import QueryArrayWidget
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe
+from recipes.models import AmountIngredient, Recipe
 
 
 class SearchIngredientFilter(SearchFilter):
     search_param = 'name'
 
 
+class NumberInFilter(BaseInFilter, NumberFilter):
+    """Список чисел: ?field=1&field=2."""
+
+
+class CharInFilter(BaseInFilter, CharFilter):
+    """Список строк: ?field=a&field=b."""
+
+
 class FilterRecipes(FilterSet):
-    """Фильтр сортировки рецептов."""
+    """Фильтр сортировки рецептов.
 
-    tags = AllValuesMultipleFilter(
-        field_name='tags__slug',
-        label='tags'
+    Все связи проверяются через EXISTS, без JOIN и DISTINCT, чтобы
+    условия обслуживались составными индексами (миграция 0012).
+    """
+
+    tags = CharInFilter(method='filter_tags', widget=QueryArrayWidget)
+    tags_mode = ChoiceFilter(
+        choices=(('any', 'Любой из тэгов'), ('all', 'Все тэги')),
+        method='filter_noop',
+    )
+    author = NumberInFilter(
+        field_name='author', lookup_expr='in', widget=QueryArrayWidget
+    )
+    cooking_time_min = NumberFilter(
+        field_name='cooking_time', lookup_expr='gte'
     )
-    favorite = BooleanFilter(method='get_favorite')
-    shopping_cart = BooleanFilter(method='get_shopping_cart')
-    author = AllValuesMultipleFilter(
-        field_name='author__id',
-        label='Автор'
+    cooking_time_max = NumberFilter(
+        field_name='cooking_time', lookup_expr='lte'
     )
+    ingredients = NumberInFilter(
+        method='filter_ingredients', widget=QueryArrayWidget
+    )
+    exclude_ingredients = NumberInFilter(
+        method='filter_exclude_ingredients', widget=QueryArrayWidget
+    )
+    is_favorited = BooleanFilter(method='filter_user_flag')
+    is_in_shopping_cart = BooleanFilter(method='filter_user_flag')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'favorite', 'shopping_cart')
+        fields = (
+            'author', 'tags', 'tags_mode', 'cooking_time_min',
+            'cooking_time_max', 'ingredients', 'exclude_ingredients',
+            'is_favorited', 'is_in_shopping_cart',
+        )
+
+    def filter_noop(
+        self, queryset: QuerySet[Recipe], name: str, value: str
+    ) -> QuerySet[Recipe]:
+        """Параметр влияет на другие фильтры, сам ничего не отбирает."""
+        return queryset
 
-    def get_favorite(self, queryset, name, value):
-        if value:
-            return queryset.filter(favorite__user=self.request.user)
+    def filter_tags(
+        self, queryset: QuerySet[Recipe], name: str, value: list[str]
+    ) -> QuerySet[Recipe]:
+        """Рецепты с любым (по умолчанию) или со всеми тэгами."""
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk')
+        )
+        if self.form.cleaned_data.get('tags_mode') != 'all':
+            return queryset.filter(
+                Exists(recipe_tags.filter(tag__slug__in=value))
+            )
+        for slug in value:
+            queryset = queryset.filter(
+                Exists(recipe_tags.filter(tag__slug=slug))
+            )
         return queryset
 
-    def get_shopping_cart(self, queryset, name, value):
-        if value:
-            return queryset.filter(shopping_cart__user=self.request.user)
+    def filter_ingredients(
+        self, queryset: QuerySet[Recipe], name: str, value: list[int]
+    ) -> QuerySet[Recipe]:
+        """Рецепты, в которых есть все указанные ингредиенты."""
+        for ingredient_id in value:
+            queryset = queryset.filter(Exists(AmountIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredients_id=ingredient_id
+            )))
         return queryset
+
+    def filter_exclude_ingredients(
+        self, queryset: QuerySet[Recipe], name: str, value: list[int]
+    ) -> QuerySet[Recipe]:
+        """Рецепты без указанных ингредиентов."""
+        return queryset.filter(~Exists(AmountIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredients_id__in=value
+        )))
+
+    def filter_user_flag(
+        self, queryset: QuerySet[Recipe], name: str, value: bool
+    ) -> QuerySet[Recipe]:
+        """Избранное и список покупок: по аннотациям из get_queryset."""
+        if self.request.user.is_anonymous:
+            return queryset
+        return queryset.filter(**{name: value})
@@ -1,27 +1,69 @@
-from django.db.models import Model, Q
+from hashlib import md5
+from typing import Callable, Iterable
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Model, Q, QuerySet
+from django.db.transaction import atomic
+from django.http import HttpResponseBase
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (
+    get_conditional_response, patch_vary_headers, quote_etag,
+)
+from django.utils.http import http_date
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.serializers import ModelSerializer
 from rest_framework.status import (
+    HTTP_200_OK,
     HTTP_201_CREATED,
     HTTP_204_NO_CONTENT,
+    HTTP_304_NOT_MODIFIED,
     HTTP_400_BAD_REQUEST,
 )
 
+from core.cache import (
+    count_response, get_response_cache, get_response_key,
+)
+from core.validators import parse_ids
+
 
 class AddDelViewMixin:
-    """Методы для добавления/удаления объекта связи между моделями."""
+    """Методы для добавления/удаления объекта связи между моделями.
+
+    relation_field - поле модели связи, указывающее на объект (второе
+    поле связи - user).
+    """
 
     add_serializer: ModelSerializer | None = None
+    relation_field: str = 'recipe'
+
+    def get_relation_queryset(self, model: Model) -> QuerySet:
+        """Объекты связи: только поля, нужные add_serializer."""
+        related_model = model._meta.get_field(
+            self.relation_field
+        ).related_model
+        return related_model.objects.only(*self.add_serializer.Meta.fields)
 
     def _create_relation(self, model: Model, obj_id: int | str) -> Response:
-        """Добавление связи М2М между объектами."""
-        if model.__name__ == 'Subscriptions':
-            queryset = self.queryset
-        else:
-            queryset = self.get_queryset()
-        obj = get_object_or_404(queryset, pk=obj_id)
-        model(None, obj.pk, self.request.user.pk).save()
+        """Добавление связи М2М между объектами.
+
+        Объект проверяется одним лёгким запросом, запись идёт в
+        savepoint: повтор связи (IntegrityError) - ответ 400, а не 500.
+        """
+        obj = get_object_or_404(self.get_relation_queryset(model), pk=obj_id)
+        try:
+            with atomic():
+                model(**{
+                    f'{self.relation_field}_id': obj.pk,
+                    'user_id': self.request.user.pk,
+                }).save()
+        except IntegrityError:
+            return Response(
+                {'error': f'{model.__name__} уже существует'},
+                status=HTTP_400_BAD_REQUEST,
+            )
         serializer: ModelSerializer = self.add_serializer(obj)
         return Response(serializer.data, status=HTTP_201_CREATED)
 
@@ -34,3 +76,167 @@ class AddDelViewMixin:
                 status=HTTP_400_BAD_REQUEST,
             )
         return Response(status=HTTP_204_NO_CONTENT)
+
+    def _bulk_relations(self, model: Model, request: Request) -> Response:
+        """Связи пользователя со списком объектов (избранное, корзина).
+
+        POST добавляет все объекты одним INSERT, уже добавленные
+        пропускаются; DELETE удаляет одним запросом с IN. Сигналы при
+        bulk_create не отправляются, кэши сбрасывает вызывающий код.
+        """
+        ids, invalid = parse_ids(
+            request.data if isinstance(request.data, list) else ()
+        )
+        if not ids or invalid:
+            return Response(
+                {'error': 'Ожидается список id'},
+                status=HTTP_400_BAD_REQUEST,
+            )
+        user = request.user
+        relation_id = f'{self.relation_field}_id'
+        if request.method == 'DELETE':
+            deleted, _ = model.objects.filter(
+                user=user, **{f'{relation_id}__in': ids}
+            ).delete()
+            if not deleted:
+                return Response(
+                    {'error': f'{model.__name__} не существует'},
+                    status=HTTP_400_BAD_REQUEST,
+                )
+            return Response(status=HTTP_204_NO_CONTENT)
+        queryset = self.get_relation_queryset(model)
+        objects = queryset.in_bulk(ids)
+        unknown = [str(pk) for pk in ids if pk not in objects]
+        if unknown:
+            return Response(
+                {'error': f'{queryset.model._meta.verbose_name_plural} '
+                          f'не существуют: {", ".join(unknown)}'},
+                status=HTTP_400_BAD_REQUEST,
+            )
+        model.objects.bulk_create(
+            (model(**{relation_id: pk}, user=user) for pk in ids),
+            ignore_conflicts=True,
+        )
+        serializer = self.add_serializer(
+            [objects[pk] for pk in ids], many=True
+        )
+        return Response(serializer.data, status=HTTP_201_CREATED)
+
+
+class CursorPaginationMixin:
+    """Курсорная пагинация по запросу клиента.
+
+    По умолчанию используется pagination_class; с параметром
+    ?pagination=cursor (и в ссылках next/previous, где есть cursor) -
+    cursor_pagination_class.
+    """
+
+    cursor_pagination_class: type[BasePagination] | None = None
+
+    @property
+    def paginator(self) -> BasePagination | None:
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if self.cursor_pagination_class is not None and (
+                params.get('pagination') == 'cursor' or 'cursor' in params
+            ):
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для list/retrieve; 304 без сериализации.
+
+    Наследник возвращает из get_validators() данные, от которых зависит
+    ответ, и время их изменения (timestamp) или None, если ответ нельзя
+    проверять по дате. Если get_validators() вернул None, запрос
+    обрабатывается как обычно.
+    """
+
+    vary_headers: tuple[str, ...] = ('Authorization',)
+
+    def get_validators(self) -> tuple[Iterable, float | None] | None:
+        raise NotImplementedError
+
+    def list(self, request: Request, *args, **kwargs) -> HttpResponseBase:
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(
+        self, request: Request, *args, **kwargs
+    ) -> HttpResponseBase:
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+    def _conditional(
+        self, handler: Callable, request: Request, *args, **kwargs
+    ) -> HttpResponseBase:
+        validators = self.get_validators()
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        etag_data, last_modified = validators
+        etag = quote_etag(
+            md5(repr(tuple(etag_data)).encode(), usedforsecurity=False)
+            .hexdigest()
+        )
+        if last_modified is not None:
+            last_modified = int(last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (HTTP_200_OK, HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, self.vary_headers)
+        return response
+
+
+class CachedResponseMixin:
+    """Кэш данных ответов list/retrieve.
+
+    Ключ строится из действия, параметров URL и запроса и версии
+    данных cache_version (core.cache), которую сбрасывают сигналы
+    моделей. Адрес сайта тоже входит в ключ: в ответах есть абсолютные
+    ссылки. В заголовке X-Cache - HIT или MISS.
+    """
+
+    cache_version: str = ''
+
+    def use_response_cache(self) -> bool:
+        return True
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request: Request, *args, **kwargs) -> Response:
+        return self._cached(super().retrieve, request, *args, **kwargs)
+
+    def _cached(
+        self, handler: Callable, request: Request, *args, **kwargs
+    ) -> Response:
+        if not self.use_response_cache():
+            return handler(request, *args, **kwargs)
+        key = get_response_key(self.cache_version, (
+            request.build_absolute_uri('/'),
+            self.action,
+            sorted(kwargs.items()),
+            sorted(request.query_params.lists()),
+        ))
+        response_cache = get_response_cache()
+        data = response_cache.get(key)
+        if data is not None:
+            count_response(self.cache_version, 'hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        count_response(self.cache_version, 'misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == HTTP_200_OK:
+            response_cache.set(
+                key, response.data, settings.RESPONSE_CACHE_TIMEOUT
+            )
+        response['X-Cache'] = 'MISS'
+        return response
@@ -1,5 +1,115 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from functools import cached_property, partial
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from core.cache import get_version
+
+COUNT_CACHE_KEY = 'pagination_count:{version}:{digest}'
 
 
 class LimitPagePagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator с кэшированным или оценочным количеством объектов.
+
+    Количество кэшируется по тексту SQL-запроса, то есть отдельно для
+    каждого набора фильтров, и по версии данных version: после её
+    сброса старое количество не используется. На PostgreSQL, если
+    оценка планировщика не меньше estimate_threshold, точный COUNT(*)
+    не выполняется.
+    """
+
+    def __init__(
+        self, object_list: QuerySet, per_page: int,
+        cache_timeout: int = 0, estimate_threshold: int | None = None,
+        version: float | str = '', **kwargs,
+    ) -> None:
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_timeout = cache_timeout
+        self.estimate_threshold = estimate_threshold
+        self.version = version
+
+    def get_estimate(self) -> int | None:
+        queryset = self.object_list.order_by()
+        if connections[queryset.db].vendor != 'postgresql':
+            return None
+        plan = json.loads(queryset.explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @cached_property
+    def count(self) -> int:
+        try:
+            sql = str(self.object_list.query)
+        except EmptyResultSet:
+            return 0
+        key = COUNT_CACHE_KEY.format(
+            version=self.version, digest=md5(sql.encode()).hexdigest()
+        )
+        count = cache.get(key)
+        if count is not None:
+            return count
+        if self.estimate_threshold is not None:
+            estimate = self.get_estimate()
+            if estimate is not None and estimate >= self.estimate_threshold:
+                count = estimate
+        if count is None:
+            count = super().count
+        cache.set(key, count, self.cache_timeout)
+        return count
+
+
+class CachedCountPagination(LimitPagePagination):
+    """Постраничная пагинация с кэшированным количеством.
+
+    Время жизни кэша и порог оценки берутся из атрибутов вьюсета
+    count_cache_timeout и count_estimate_threshold, иначе из настроек.
+    Кэш привязан к версии данных cache_version вьюсета (core.cache).
+    Если метод вьюсета use_count_cache() возвращает False, количество
+    считается обычным COUNT(*).
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        use_count_cache = getattr(view, 'use_count_cache', None)
+        if use_count_cache is not None and not use_count_cache():
+            self.django_paginator_class = Paginator
+            return super().paginate_queryset(queryset, request, view)
+        cache_version = getattr(view, 'cache_version', '')
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            cache_timeout=getattr(
+                view, 'count_cache_timeout',
+                settings.PAGINATION_COUNT_CACHE_TIMEOUT,
+            ),
+            estimate_threshold=getattr(
+                view, 'count_estimate_threshold',
+                settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD,
+            ),
+            version=get_version(cache_version) if cache_version else '',
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+
+class LimitCursorPagination(CursorPagination):
+    """Курсорная пагинация без COUNT(*) и OFFSET.
+
+    Позиция страницы - значение первого поля сортировки, поэтому
+    глубокие страницы отдаются так же быстро, как первая.
+    """
+
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+
+class UserCursorPagination(LimitCursorPagination):
+    ordering = ('-id',)
@@ -35,7 +35,7 @@ class AdminOrReadOnly(ActivePermission):
     """Права доступа для админов."""
 
     def has_object_permission(
-            self, request: WSGIRequest, view: APIRootView
+            self, request: WSGIRequest, view: APIRootView, obj: Model
     ) -> bool:
         return (
             request.method in SAFE_METHODS
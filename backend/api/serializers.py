@@ -1,17 +1,26 @@
 from collections import OrderedDict
+from functools import partial
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db.models import F, QuerySet
-from django.db.transaction import atomic
-from drf_extra_fields.fields import Base64ImageField
+from django.db.models import prefetch_related_objects
+from django.db.transaction import atomic, on_commit
 from rest_framework.serializers import (
-    IntegerField, ModelSerializer, SerializerMethodField
+    CharField, IntegerField, ModelSerializer, SerializerMethodField
 )
 
+from .fields import Base64ImageField
+from core.cache import bump_version
+from core.search import ingredient_index
+from core.tasks import run_in_background
 from core.validators import IngredientsValidator, TagsValidator
-from core.utilities import recipe_ingredients_set
-from recipes.models import Ingredient, Recipe, Tag
+from core.utilities import (
+    recipe_ingredients_prefetch, recipe_ingredients_set,
+    recipe_ingredients_update,
+)
+from recipes.images import process_recipe_image
+from recipes.models import AmountIngredient, Ingredient, Recipe, Tag
 
 User = get_user_model()
 
@@ -41,10 +50,26 @@ class UserSerializer(ModelSerializer):
 
     def get_is_subscribed(self, obj: User) -> bool:
         """Проверка подписок."""
-        user = self.context.get('request').user
+        request = self.context.get('request')
+        if request is None:
+            return False
+        user = request.user
         if user.is_anonymous or (user == obj):
             return False
-        return user.subscriber.filter(author=obj).exists()
+        return obj.pk in self._get_subscriptions(request)
+
+    @staticmethod
+    def _get_subscriptions(request) -> set[int]:
+        """Id авторов, на которых подписан пользователь.
+
+        Загружаются один раз за запрос и сохраняются в самом запросе,
+        чтобы каждый блок автора не делал отдельный запрос к БД.
+        """
+        if not hasattr(request, 'subscribed_authors'):
+            request.subscribed_authors = set(
+                request.user.subscriber.values_list('author_id', flat=True)
+            )
+        return request.subscribed_authors
 
     def create(self, validated_data: dict) -> User:
         """Создание нового пользователя."""
@@ -79,13 +104,15 @@ class UserSubscribeSerializer(UserSerializer):
 
     def get_recipes(self, obj):
         """Получение списка рецептов автора."""
-        request = self.context.get('request')
-        recipe_limit = None
-        if request:
-            recipe_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all().order_by('-pub_date')
-        if recipe_limit:
-            recipes = recipes[:int(recipe_limit)]
+        recipes = getattr(obj, 'last_recipes', None)
+        if recipes is None:
+            request = self.context.get('request')
+            recipe_limit = None
+            if request:
+                recipe_limit = request.query_params.get('recipes_limit')
+            recipes = obj.recipes.all().order_by('-pub_date')
+            if recipe_limit:
+                recipes = recipes[:int(recipe_limit)]
         serializer = RecipeShortSerializer(
             recipes, many=True, context=self.context)
         return serializer.data
@@ -117,35 +144,72 @@ class IngredientSerializer(ModelSerializer):
         read_only_fields = fields
 
 
+class AmountIngredientSerializer(ModelSerializer):
+    """Сериализатор вывода ингредиентов рецепта с количеством."""
+
+    id = IntegerField(source='ingredients.id', read_only=True)
+    name = CharField(source='ingredients.name', read_only=True)
+    measurement_unit = CharField(
+        source='ingredients.measurement_unit', read_only=True
+    )
+
+    class Meta:
+        model = AmountIngredient
+        fields = ('id', 'name', 'measurement_unit', 'amount',)
+        read_only_fields = fields
+
+
 class RecipeSerialiser(ModelSerializer):
     """Сериализатор рецептов."""
 
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
-    ingredients = SerializerMethodField()
+    ingredients = AmountIngredientSerializer(
+        source='ingredient', many=True, read_only=True
+    )
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
     image = Base64ImageField()
+    renditions = SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+            'is_in_shopping_cart', 'name', 'image', 'renditions', 'text',
+            'cooking_time',
         )
-        read_only_fields = ('is_favorited', 'is_in_shopping_cart',)
-
-    def get_ingredients(self, recipe: Recipe) -> QuerySet[dict]:
-        """Получение списка ингредиентов для рецепта."""
-        ingredients = recipe.ingredients.values(
-            'id', 'name', 'measurement_unit', amount=F(
-                'ingredient_recipes__amount'
-            )
+        read_only_fields = (
+            'is_favorited', 'is_in_shopping_cart', 'renditions',
         )
-        return ingredients
+
+    def to_representation(self, recipe: Recipe) -> OrderedDict:
+        """Ингредиенты в том же порядке, что и в предвыборке вьюсета.
+
+        После создания и изменения рецепта предвыборки нет, она
+        выполняется здесь; уже загруженные ингредиенты не запрашиваются.
+        """
+        prefetch_related_objects([recipe], recipe_ingredients_prefetch())
+        return super().to_representation(recipe)
+
+    def get_renditions(self, recipe: Recipe) -> dict[str, dict[str, str]]:
+        """Ссылки на размеры изображения для разных экранов."""
+        request = self.context.get('request')
+        renditions = recipe.get_renditions()
+        if request is None:
+            return renditions
+        return {
+            rendition: {
+                extension: request.build_absolute_uri(url)
+                for extension, url in urls.items()
+            }
+            for rendition, urls in renditions.items()
+        }
 
     def get_is_favorited(self, recipe: Recipe) -> bool:
         """Проверка нахождения рецепта в избранных."""
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         user = self.context.get('view').request.user
         if user.is_anonymous:
             return False
@@ -153,6 +217,8 @@ class RecipeSerialiser(ModelSerializer):
 
     def get_is_in_shopping_cart(self, recipe: Recipe) -> bool:
         """Проверка нахождения рецепта в списке покупок."""
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         user = self.context.get('view').request.user
         if user.is_anonymous:
             return False
@@ -164,8 +230,26 @@ class RecipeSerialiser(ModelSerializer):
         ingredients = self.initial_data.get('ingredients')
         if not tags_id or not ingredients:
             raise ValidationError('Не хватает данных')
-        tags = TagsValidator.validate(tags_id, Tag)
-        ingredients = IngredientsValidator.validate(ingredients, Ingredient)
+        errors = {}
+        try:
+            tags = TagsValidator.validate(
+                tags_id, Tag, self.context.get('tags')
+            )
+        except ValidationError as error:
+            errors['tags'] = error.messages
+        # Индекс в памяти - только при поиске через него, иначе каждый
+        # воркер загружал бы весь справочник ради проверки рецепта.
+        index = None
+        if settings.INGREDIENT_SEARCH_BACKEND == 'memory':
+            index = ingredient_index
+        try:
+            ingredients = IngredientsValidator.validate(
+                ingredients, Ingredient, index
+            )
+        except ValidationError as error:
+            errors['ingredients'] = error.messages
+        if errors:
+            raise ValidationError(errors)
         data.update(
             {'tags': tags, 'ingredients': ingredients,
              'author': self.context.get('request').user, }
@@ -182,15 +266,43 @@ class RecipeSerialiser(ModelSerializer):
         recipe_ingredients_set(recipe, ingredients)
         return recipe
 
+    @staticmethod
+    @atomic
+    def bulk_create(items: list[dict]) -> list[Recipe]:
+        """Запись пачки проверенных рецептов тремя bulk_create.
+
+        bulk_create не вызывает Recipe.save(), поэтому обработка
+        изображений и сброс кэша рецептов запускаются здесь.
+        """
+        tags = [item.pop('tags') for item in items]
+        ingredients = [item.pop('ingredients') for item in items]
+        recipes = Recipe.objects.bulk_create(
+            Recipe(**item) for item in items
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag.pk)
+            for recipe, recipe_tags in zip(recipes, tags)
+            for tag in recipe_tags
+        )
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(
+                recipe=recipe, ingredients=ingredient, amount=amount
+            )
+            for recipe, recipe_ingredients in zip(recipes, ingredients)
+            for ingredient, amount in recipe_ingredients.values()
+        )
+        for recipe in recipes:
+            run_in_background(process_recipe_image, recipe.pk)
+        on_commit(partial(bump_version, 'recipes'))
+        return recipes
+
     @atomic
     def update(self, intance: Recipe, validated_data: dict):
         """Изменение рецепта."""
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         if tags:
-            intance.tags.clear()
             intance.tags.set(tags)
         if ingredients:
-            intance.ingredients.clear()
-            recipe_ingredients_set(intance, ingredients)
+            recipe_ingredients_update(intance, ingredients)
         return super().update(intance, validated_data)
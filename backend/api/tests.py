@@ -0,0 +1,599 @@
+import shutil
+import tempfile
+from base64 import b64encode
+from io import BytesIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from core.cache import (
+    get_response_stats, get_versions, reset_response_stats,
+)
+from core.tasks import _run
+from core.search import ingredient_index
+from core.shopping_list import (
+    get_cache_key, get_shopping_list_ingredients,
+    invalidate_recipes_shopping_lists,
+)
+from recipes.models import (
+    AmountIngredient, Basket, Favorite, Ingredient, Recipe, Tag,
+)
+from users.models import Subscriptions
+
+User = get_user_model()
+
+RECIPES_URL = '/api/recipes/'
+
+
+class RecipesDataMixin:
+    """Авторы, тэги, ингредиенты и рецепты для проверок запросов к БД."""
+
+    recipes_count = 24
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{i}@foodgram.ru', username=f'author{i}',
+                first_name='Имя', last_name='Фамилия', password='password1',
+            )
+            for i in range(4)
+        ]
+        cls.user = cls.authors[0]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'тэг{i}', color=f'#00000{i}', slug=f'tag{i}'
+            )
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент{i}', measurement_unit='г'
+            )
+            for i in range(6)
+        ]
+        cls.recipes = []
+        for i in range(cls.recipes_count):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт{i}', author=cls.authors[i % len(cls.authors)],
+                text='Описание', cooking_time=10 + i, image=f'recipe{i}.png',
+            )
+            recipe.tags.set(cls.tags[:1 + i % len(cls.tags)])
+            AmountIngredient.objects.bulk_create(
+                AmountIngredient(
+                    recipe=recipe,
+                    ingredients=cls.ingredients[(i + k) % 6],
+                    amount=k + 1,
+                )
+                for k in range(3)
+            )
+            cls.recipes.append(recipe)
+        Subscriptions.objects.create(user=cls.user, author=cls.authors[1])
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[1])
+        Basket.objects.create(user=cls.user, recipe=cls.recipes[2])
+        get_versions('tags', 'ingredients', 'recipes')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+
+class RecipeListQueriesTest(RecipesDataMixin, APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for limit in (3, 6, 20):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(6):
+                    response = self.client.get(
+                        RECIPES_URL, {'limit': limit}
+                    )
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_cached_count_follows_recipe_changes(self):
+        response = self.client.get(RECIPES_URL, {'limit': 3})
+        self.assertEqual(response.json()['count'], self.recipes_count)
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(
+                name='Новый', author=self.user, text='Описание',
+                cooking_time=5,
+            )
+        response = self.client.get(RECIPES_URL, {'limit': 3})
+        self.assertEqual(response.json()['count'], self.recipes_count + 1)
+
+    def test_user_flag_counts_follow_relation_changes(self):
+        for url, flag, existing in (
+            ('favorite', 'is_favorited', self.recipes[1]),
+            ('shopping_cart', 'is_in_shopping_cart', self.recipes[2]),
+        ):
+            with self.subTest(flag=flag):
+                expected = [existing.pk]
+                response = self.client.get(RECIPES_URL, {flag: 1, 'limit': 10})
+                self.assertEqual(response.json()['count'], 1)
+                self.client.post(f'{RECIPES_URL}{self.recipes[3].pk}/{url}/')
+                self.client.post(
+                    f'{RECIPES_URL}{url}/', [self.recipes[4].pk],
+                    format='json',
+                )
+                expected += [self.recipes[3].pk, self.recipes[4].pk]
+                response = self.client.get(RECIPES_URL, {flag: 1, 'limit': 10})
+                self.assertEqual(response.json()['count'], len(expected))
+                self.assertEqual(
+                    {recipe['id'] for recipe in response.json()['results']},
+                    set(expected),
+                )
+
+    def test_ingredients_are_ordered_by_name(self):
+        response = self.client.get(RECIPES_URL, {'limit': 6})
+        for recipe in response.json()['results']:
+            names = [
+                ingredient['name'] for ingredient in recipe['ingredients']
+            ]
+            self.assertEqual(names, sorted(names))
+
+    def test_user_flags_are_annotated(self):
+        response = self.client.get(RECIPES_URL, {'limit': 50})
+        recipes = {
+            recipe['id']: recipe for recipe in response.json()['results']
+        }
+        self.assertTrue(recipes[self.recipes[1].pk]['is_favorited'])
+        self.assertTrue(recipes[self.recipes[2].pk]['is_in_shopping_cart'])
+        self.assertFalse(recipes[self.recipes[3].pk]['is_favorited'])
+
+
+class SubscriptionFlagQueriesTest(RecipesDataMixin, APITestCase):
+    """Подписки на авторов загружаются одним запросом на весь ответ."""
+
+    def test_recipe_list_queries(self):
+        with self.assertNumQueries(6):
+            response = self.client.get(RECIPES_URL, {'limit': 20})
+        authors = {
+            recipe['author']['id']: recipe['author']['is_subscribed']
+            for recipe in response.json()['results']
+        }
+        self.assertEqual(len(authors), len(self.authors))
+        self.assertTrue(authors[self.authors[1].pk])
+        self.assertFalse(authors[self.authors[2].pk])
+
+    def test_user_list_queries(self):
+        for limit in (2, 4):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(3):
+                    response = self.client.get('/api/users/', {'limit': limit})
+                self.assertEqual(len(response.json()['results']), limit)
+
+
+class RecipeFilterSqlTest(RecipesDataMixin, APITestCase):
+    """Фильтры рецептов - подзапросы EXISTS без JOIN и DISTINCT."""
+
+    joined_tables = (
+        'recipes_favorite', 'recipes_basket', 'recipes_recipe_tags',
+        'recipes_amountingredient',
+    )
+
+    def get_recipes_sql(self, params: dict) -> tuple[list[dict], str]:
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(RECIPES_URL, {'limit': 50, **params})
+        self.assertEqual(response.status_code, 200)
+        sql = next(
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "recipes_recipe"' in query['sql']
+            and 'COUNT(' not in query['sql']
+        )
+        return response.json()['results'], sql
+
+    def test_filters_use_exists(self):
+        ingredient = self.ingredients[0].pk
+        for params in (
+            {'tags': 'tag1'},
+            {'tags': ['tag1', 'tag2'], 'tags_mode': 'all'},
+            {'is_favorited': 1},
+            {'is_in_shopping_cart': 'true'},
+            {'is_favorited': 0, 'is_in_shopping_cart': 0},
+            {'ingredients': ingredient},
+            {'exclude_ingredients': ingredient},
+        ):
+            with self.subTest(params=params):
+                _, sql = self.get_recipes_sql(params)
+                self.assertIn('EXISTS', sql)
+                self.assertNotIn('DISTINCT', sql)
+                for table in self.joined_tables:
+                    self.assertNotIn(f'JOIN "{table}"', sql)
+
+    def test_filter_results(self):
+        recipes, _ = self.get_recipes_sql({'is_favorited': 1})
+        self.assertEqual(
+            [recipe['id'] for recipe in recipes], [self.recipes[1].pk]
+        )
+        recipes, _ = self.get_recipes_sql(
+            {'tags': ['tag1', 'tag2'], 'tags_mode': 'all'}
+        )
+        self.assertEqual(
+            {recipe['id'] for recipe in recipes},
+            {recipe.pk for recipe in self.recipes[2::3]},
+        )
+        recipes, _ = self.get_recipes_sql({'tags': ['tag1', 'tag2']})
+        self.assertEqual(
+            len(recipes), len(self.recipes) - len(self.recipes[::3])
+        )
+
+
+class RecipeIngredientsUpdateTest(RecipesDataMixin, APITestCase):
+    """PATCH рецепта пишет только изменившиеся ингредиенты."""
+
+    def patch_ingredients(self, amounts: dict[int, int]) -> list[str]:
+        """Изменяющие запросы к ингредиентам рецепта при PATCH."""
+        recipe = self.recipes[0]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                f'{RECIPES_URL}{recipe.pk}/',
+                {
+                    'tags': [tag.pk for tag in recipe.tags.all()],
+                    'ingredients': [
+                        {'id': self.ingredients[index].pk, 'amount': amount}
+                        for index, amount in amounts.items()
+                    ],
+                },
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        names = [
+            ingredient['name'] for ingredient in response.json()['ingredients']
+        ]
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(
+            dict(AmountIngredient.objects.filter(recipe=recipe).values_list(
+                'ingredients_id', 'amount'
+            )),
+            {
+                self.ingredients[index].pk: amount
+                for index, amount in amounts.items()
+            },
+        )
+        return [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            and '"recipes_amountingredient"' in query['sql']
+        ]
+
+    def test_database_search_backend_skips_memory_index(self):
+        with self.settings(INGREDIENT_SEARCH_BACKEND='database'), patch.object(
+            ingredient_index, '_load', side_effect=AssertionError
+        ):
+            self.assertEqual(len(self.patch_ingredients({0: 2, 4: 1})), 3)
+
+    def test_unchanged_ingredients_are_not_written(self):
+        self.assertEqual(self.patch_ingredients({0: 1, 1: 2, 2: 3}), [])
+
+    def test_changed_amount_is_one_update(self):
+        writes = self.patch_ingredients({0: 1, 1: 5, 2: 3})
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('UPDATE'))
+
+    def test_replaced_ingredient_is_one_delete_and_one_insert(self):
+        writes = self.patch_ingredients({0: 1, 1: 2, 3: 3})
+        self.assertEqual(
+            [sql.split()[0] for sql in writes], ['DELETE', 'INSERT']
+        )
+
+
+class RelationCreateTest(RecipesDataMixin, APITestCase):
+    """Создание подписок, избранного и корзины через AddDelViewMixin."""
+
+    def test_subscribe(self):
+        author = self.authors[2]
+        response = self.client.post(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['id'], author.pk)
+        self.assertTrue(Subscriptions.objects.filter(
+            user=self.user, author=author
+        ).exists())
+        response = self.client.post(
+            f'/api/users/{self.authors[1].pk}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_recipe_relations(self):
+        for model, url, recipe, existing in (
+            (Favorite, 'favorite', self.recipes[3], self.recipes[1]),
+            (Basket, 'shopping_cart', self.recipes[4], self.recipes[2]),
+        ):
+            with self.subTest(url=url):
+                response = self.client.post(
+                    f'{RECIPES_URL}{recipe.pk}/{url}/'
+                )
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.json()['id'], recipe.pk)
+                self.assertTrue(model.objects.filter(
+                    user=self.user, recipe=recipe
+                ).exists())
+                response = self.client.post(
+                    f'{RECIPES_URL}{existing.pk}/{url}/'
+                )
+                self.assertEqual(response.status_code, 400)
+
+
+class RelationBulkTest(RecipesDataMixin, APITestCase):
+    """Избранное и корзина списком рецептов."""
+
+    def post(self, url: str, data, method: str = 'post'):
+        return getattr(self.client, method)(
+            f'{RECIPES_URL}{url}/', data, format='json'
+        )
+
+    def favorite_ids(self) -> set[int]:
+        return set(Favorite.objects.filter(
+            user=self.user
+        ).values_list('recipe_id', flat=True))
+
+    def test_add_with_duplicates(self):
+        ids = [self.recipes[3].pk, self.recipes[4].pk, self.recipes[1].pk]
+        response = self.post('favorite', [*ids, self.recipes[3].pk])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([recipe['id'] for recipe in response.json()], ids)
+        self.assertEqual(self.favorite_ids(), set(ids))
+
+    def test_unknown_and_invalid_ids(self):
+        for data in (
+            [self.recipes[3].pk, 10 ** 6], ['рецепт'], [], {'id': 1},
+        ):
+            with self.subTest(data=data):
+                response = self.post('favorite', data)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(self.favorite_ids(), {self.recipes[1].pk})
+
+    def test_delete(self):
+        self.post('favorite', [self.recipes[3].pk])
+        response = self.post(
+            'favorite', [self.recipes[1].pk, self.recipes[3].pk], 'delete'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.favorite_ids(), set())
+        response = self.post('favorite', [self.recipes[1].pk], 'delete')
+        self.assertEqual(response.status_code, 400)
+
+    def test_shopping_cart_invalidates_list(self):
+        def names() -> set[str]:
+            return {
+                item['name']
+                for item in get_shopping_list_ingredients(self.user)
+            }
+
+        before = names()
+        response = self.post('shopping_cart', [self.recipes[5].pk])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            names(), before | {ingredient.name for ingredient in (
+                self.ingredients[5], self.ingredients[0], self.ingredients[1],
+            )},
+        )
+        self.post('shopping_cart', [self.recipes[5].pk], 'delete')
+        self.assertEqual(names(), before)
+
+
+class IngredientSearchTest(RecipesDataMixin, APITestCase):
+    """Параметр name ищет ингредиенты только в списке."""
+
+    def test_retrieve_ignores_name(self):
+        ingredient = self.ingredients[0]
+        for backend in ('memory', 'database'):
+            with self.subTest(backend=backend), self.settings(
+                INGREDIENT_SEARCH_BACKEND=backend
+            ):
+                response = self.client.get(
+                    f'/api/ingredients/{ingredient.pk}/', {'name': 'инг'}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['id'], ingredient.pk)
+                response = self.client.get(
+                    '/api/ingredients/', {'name': 'ингредиент1'}
+                )
+                self.assertEqual(
+                    [item['name'] for item in response.json()],
+                    ['ингредиент1'],
+                )
+
+
+class ShoppingListInvalidationTest(RecipesDataMixin, APITestCase):
+    """Сброс кэша списков покупок не зависит от числа корзин."""
+
+    def test_invalidate_recipe_in_many_baskets(self):
+        recipe = self.recipes[5]
+        Basket.objects.bulk_create(
+            Basket(user=author, recipe=recipe) for author in self.authors
+        )
+        for author in self.authors:
+            get_shopping_list_ingredients(author)
+        with self.assertNumQueries(2):
+            invalidate_recipes_shopping_lists([recipe.pk])
+        self.assertFalse(any(
+            cache.has_key(get_cache_key(author.pk))
+            for author in self.authors
+        ))
+
+
+class BackgroundTaskTest(APITestCase):
+    """Ошибки фоновых задач попадают в лог."""
+
+    def test_task_error_is_logged(self):
+        def broken_task(recipe_id: int) -> None:
+            raise FileNotFoundError(recipe_id)
+
+        with self.assertLogs('core.tasks', 'ERROR') as logs:
+            _run(broken_task, 1)
+        self.assertIn('broken_task', logs.output[0])
+
+
+class RecipeConditionalGetTest(RecipesDataMixin, APITestCase):
+    """ETag и Last-Modified страницы рецепта."""
+
+    def get_recipe(self, **headers):
+        return self.client.get(
+            f'{RECIPES_URL}{self.recipes[1].pk}/', **headers
+        )
+
+    def assertChangesETag(self, change):
+        etag = self.get_recipe()['ETag']
+        self.assertEqual(
+            self.get_recipe(HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        change()
+        response = self.get_recipe(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_matching_etag_returns_304(self):
+        response = self.get_recipe()
+        self.assertEqual(response.status_code, 200)
+        response = self.get_recipe(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_recipe_change(self):
+        def change():
+            recipe = Recipe.objects.get(pk=self.recipes[1].pk)
+            recipe.cooking_time += 1
+            recipe.save(update_fields=('cooking_time', 'updated_at'))
+
+        self.assertChangesETag(change)
+
+    def test_author_change(self):
+        self.assertChangesETag(lambda: User.objects.filter(
+            pk=self.recipes[1].author_id
+        ).update(first_name='Другое'))
+
+    def test_catalog_change(self):
+        self.assertChangesETag(
+            lambda: Tag.objects.create(
+                name='новый', color='#000010', slug='new'
+            )
+        )
+
+    def test_user_relation_change(self):
+        self.assertChangesETag(lambda: Favorite.objects.filter(
+            user=self.user, recipe=self.recipes[1]
+        ).delete())
+
+    def test_last_modified_only_for_anonymous(self):
+        response = self.get_recipe()
+        self.assertNotIn('Last-Modified', response)
+        self.client.force_authenticate(None)
+        response = self.get_recipe()
+        last_modified = response['Last-Modified']
+        response = self.get_recipe(HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+
+class ResponseCacheStatsTest(RecipesDataMixin, APITestCase):
+    """Счётчики попаданий кэша ответов."""
+
+    def test_hits_and_misses(self):
+        reset_response_stats('tags')
+        for _ in range(3):
+            response = self.client.get('/api/tags/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(
+            get_response_stats('tags'), {'hits': 2, 'misses': 1}
+        )
+
+
+def make_image() -> str:
+    """Картинка 1x1 в base64 для создания рецептов."""
+    buffer = BytesIO()
+    Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + b64encode(buffer.getvalue()).decode()
+
+
+class RecipeBulkCreateTest(RecipesDataMixin, APITestCase):
+    """Создание списка рецептов одним запросом."""
+
+    url = f'{RECIPES_URL}bulk/'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        cls.image = make_image()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def make_recipe(self, name: str, **fields) -> dict:
+        return {
+            'name': name, 'text': 'Описание', 'cooking_time': 5,
+            'image': self.image, 'tags': [self.tags[0].pk],
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 10}],
+            **fields,
+        }
+
+    def test_results_in_input_order(self):
+        response = self.client.post(self.url, [
+            self.make_recipe('Первый'),
+            self.make_recipe('Без тэгов', tags=[]),
+            self.make_recipe('Второй'),
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        results = response.json()
+        self.assertEqual(
+            [result['status'] for result in results], [201, 400, 201]
+        )
+        self.assertEqual(results[0]['recipe']['name'], 'Первый')
+        self.assertEqual(results[2]['recipe']['name'], 'Второй')
+        self.assertIn('errors', results[1])
+        self.assertEqual(
+            Recipe.objects.filter(
+                author=self.user, name__in=('Первый', 'Второй')
+            ).count(),
+            2,
+        )
+
+    def test_duplicate_names(self):
+        existing = self.recipes[0].name
+        response = self.client.post(self.url, [
+            self.make_recipe('Новый'),
+            self.make_recipe('Новый'),
+            self.make_recipe(existing),
+        ], format='json')
+        self.assertEqual(
+            [result['status'] for result in response.json()],
+            [201, 400, 400],
+        )
+        self.assertEqual(
+            Recipe.objects.filter(author=self.user, name='Новый').count(), 1
+        )
+        self.assertEqual(
+            Recipe.objects.filter(author=self.user, name=existing).count(), 1
+        )
+
+    def test_all_invalid(self):
+        response = self.client.post(self.url, [
+            self.make_recipe('Без ингредиентов', ingredients=[]),
+            self.make_recipe('Долгий', cooking_time=0),
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [result['status'] for result in response.json()], [400, 400]
+        )
+        self.assertEqual(Recipe.objects.count(), self.recipes_count)
+
+    def test_max_size(self):
+        with self.settings(RECIPES_BULK_MAX_SIZE=2):
+            response = self.client.post(self.url, [
+                self.make_recipe(f'Рецепт {i}') for i in range(3)
+            ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+        self.assertEqual(Recipe.objects.count(), self.recipes_count)
@@ -1,7 +1,11 @@
-from django.db.models import Count, Q, QuerySet
+from django.db.models import (
+    Count, Exists, OuterRef, Prefetch, Q, QuerySet, Value,
+)
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.handlers.wsgi import WSGIRequest
-from django.http.response import HttpResponse
+from django.http.response import StreamingHttpResponse
+from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as UserViewSetDjoser
 from rest_framework import status
 from rest_framework.decorators import action
@@ -13,30 +17,47 @@ from rest_framework.routers import APIRootView
 from rest_framework.status import HTTP_400_BAD_REQUEST
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from .mixins import AddDelViewMixin
-from .paginations import LimitPagePagination
+from .filters import FilterRecipes
+from .mixins import (
+    AddDelViewMixin, CachedResponseMixin, ConditionalGetMixin,
+    CursorPaginationMixin,
+)
+from .paginations import (
+    CachedCountPagination, LimitCursorPagination, LimitPagePagination,
+    UserCursorPagination,
+)
 from .permission import AuthorOrReadOnly, AdminOrReadOnly
 from .serializers import (IngredientSerializer, RecipeSerialiser,
                           RecipeShortSerializer, TagSerializer,
                           UserSubscribeSerializer,)
-from core.utilities import create_shoping_list, incorrect_keyboard_layout
+from core.cache import get_version, get_versions
+from core.search import ingredient_index, search_ingredients
+from core.shopping_list import (
+    SHOPPING_LIST_RENDERERS, get_shopping_list_ingredients,
+    invalidate_shopping_lists,
+)
+from core.utilities import recipe_ingredients_prefetch
 from recipes.models import (Favorite, Ingredient, Recipe,
                             Basket, Tag)
 from users.models import Subscriptions
 
 User = get_user_model()
 
+USER_FLAG_FILTERS = {'is_favorited', 'is_in_shopping_cart'}
+
 
 class BaseApiRootView(APIRootView):
     """Базовые пути API."""
 
 
-class UserViewSet(UserViewSetDjoser, AddDelViewMixin):
+class UserViewSet(CursorPaginationMixin, UserViewSetDjoser, AddDelViewMixin):
     """Вьюсет для пользователей."""
 
     pagination_class = LimitPagePagination
+    cursor_pagination_class = UserCursorPagination
     permission_classes = (DjangoModelPermissions,)
     add_serializer = UserSubscribeSerializer
+    relation_field = 'author'
 
     @action(detail=True, permission_classes=(IsAuthenticated,))
     def subscribe(self, request: WSGIRequest, id: int | str) -> Response:
@@ -46,6 +67,11 @@ class UserViewSet(UserViewSetDjoser, AddDelViewMixin):
     def create_subscribe(
         self, request: WSGIRequest, id: int | str
     ) -> Response:
+        if str(id) == str(request.user.pk):
+            return Response(
+                {'error': 'Нельзя подписаться на себя'},
+                status=HTTP_400_BAD_REQUEST,
+            )
         return self._create_relation(Subscriptions, id)
 
     @subscribe.mapping.delete
@@ -62,7 +88,9 @@ class UserViewSet(UserViewSetDjoser, AddDelViewMixin):
         try:
             annotated_queryset = User.objects.filter(
                 following__user=request.user
-            ).annotate(recipes_count=Count('recipes'))
+            ).annotate(
+                recipes_count=Count('recipes')
+            ).prefetch_related(self._get_recipes_prefetch())
             pages = self.paginate_queryset(annotated_queryset)
             serialiser = UserSubscribeSerializer(
                 pages,
@@ -75,67 +103,231 @@ class UserViewSet(UserViewSetDjoser, AddDelViewMixin):
                 str(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def get_relation_queryset(self, model: Subscriptions) -> QuerySet[User]:
+        """Автор для ответа на подписку, с рецептами и их числом."""
+        return self.queryset.annotate(
+            recipes_count=Count('recipes')
+        ).prefetch_related(self._get_recipes_prefetch())
 
-class TagViewSet(ReadOnlyModelViewSet):
+    def _get_recipes_prefetch(self) -> Prefetch:
+        """Последние рецепты всех авторов страницы одним запросом."""
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'cooking_time', 'author'
+        ).order_by('-pub_date')
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes[:int(recipes_limit)]
+        return Prefetch('recipes', queryset=recipes, to_attr='last_recipes')
+
+
+class TagViewSet(
+    ConditionalGetMixin, CachedResponseMixin, ReadOnlyModelViewSet
+):
     """Вьюсет для тэгов."""
 
+    cache_version = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AdminOrReadOnly,)
 
+    def get_validators(self) -> tuple[tuple, float]:
+        version = get_version(self.cache_version)
+        return (version,), version
+
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ConditionalGetMixin, CachedResponseMixin, ReadOnlyModelViewSet
+):
     """Вьюсет для ингредиентов."""
 
+    cache_version = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AdminOrReadOnly,)
 
-    def get_queryset(self) -> list[Ingredient]:
-        name: str = self.request.query_params.get('name').strip()
-        if name:
-            name = incorrect_keyboard_layout(name)
-            return self.queryset.filter(name__icontains=name)
+    def get_queryset(self) -> QuerySet[Ingredient]:
+        """Поиск по ?name= только в списке, retrieve ищет по id."""
+        name: str = self.request.query_params.get('name', '').strip()
+        if name and self.action == 'list':
+            return search_ingredients(self.queryset, name)
         return self.queryset
 
+    def filter_queryset(
+        self, queryset: QuerySet[Ingredient]
+    ) -> QuerySet[Ingredient] | list[Ingredient]:
+        """Автодополнение из индекса в памяти, без запроса к БД."""
+        name: str = self.request.query_params.get('name', '').strip()
+        if (
+            self.action != 'list' or not name
+            or settings.INGREDIENT_SEARCH_BACKEND != 'memory'
+        ):
+            return super().filter_queryset(queryset)
+        return ingredient_index.search(name)
 
-class RecipeViewSet(ModelViewSet, AddDelViewMixin):
+    def get_validators(self) -> tuple[tuple, float]:
+        version = get_version(self.cache_version)
+        return (version,), version
+
+
+class RecipeViewSet(
+    CursorPaginationMixin, ConditionalGetMixin, CachedResponseMixin,
+    ModelViewSet, AddDelViewMixin,
+):
     """Вьюсет для рецептов."""
 
+    cache_version = 'recipes'
     serializer_class = RecipeSerialiser
-    pagination_class = LimitPagePagination
+    pagination_class = CachedCountPagination
+    cursor_pagination_class = LimitCursorPagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = FilterRecipes
+    count_cache_timeout = settings.PAGINATION_COUNT_CACHE_TIMEOUT
+    count_estimate_threshold = settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
     permission_classes = (AuthorOrReadOnly,)
     add_serializer = RecipeShortSerializer
 
     def get_queryset(self) -> QuerySet[Recipe]:
         """Получение списка запрошенных объектов."""
         queryset = Recipe.objects.select_related('author').prefetch_related(
-            'ingredient__ingredients', 'tags'
+            recipe_ingredients_prefetch(), 'tags'
+        )
+        return self._annotate_user_flags(queryset)
+
+    def use_response_cache(self) -> bool:
+        """Ответы анонимам не зависят от пользователя и кэшируются."""
+        return self.request.user.is_anonymous
+
+    def use_count_cache(self) -> bool:
+        """Без кэша количества при фильтрах по избранному и корзине.
+
+        Они меняются без сброса версии 'recipes', а Paginator обрезает
+        страницу по устаревшему количеству.
+        """
+        return self.request.user.is_anonymous or not (
+            USER_FLAG_FILTERS & self.request.query_params.keys()
+        )
+
+    def get_validators(self) -> tuple[tuple, float | None] | None:
+        """Состояние рецепта для ETag без загрузки самого рецепта.
+
+        Ответ зависит от рецепта, его автора, справочников тэгов и
+        ингредиентов, а для пользователя ещё от избранного, корзины и
+        подписки на автора. Эти отметки без дат, поэтому Last-Modified
+        отдаётся только анонимным пользователям; изменения автора в нём
+        учитываются через версию 'recipes' (см. recipes.signals).
+        """
+        pk = str(self.kwargs.get(self.lookup_field, ''))
+        if self.action != 'retrieve' or not pk.isdigit():
+            return None
+        user = self.request.user
+        fields = [
+            'updated_at', 'author__email', 'author__username',
+            'author__first_name', 'author__last_name', 'is_favorited',
+            'is_in_shopping_cart',
+        ]
+        queryset = self._annotate_user_flags(Recipe.objects.filter(pk=pk))
+        if not user.is_anonymous:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscriptions.objects.filter(
+                    user=user, author=OuterRef('author')
+                )
+            ))
+            fields.append('is_subscribed')
+        state = queryset.values_list(*fields).first()
+        if state is None:
+            return None
+        *catalog, recipes_version = get_versions(
+            'tags', 'ingredients', 'recipes'
+        )
+        last_modified = None
+        if user.is_anonymous:
+            last_modified = max(
+                state[0].timestamp(), *catalog, recipes_version
+            )
+        return (pk, *state, *catalog), last_modified
+
+    def _annotate_user_flags(
+        self, queryset: QuerySet[Recipe]
+    ) -> QuerySet[Recipe]:
+        """Отметки избранного и списка покупок в основном запросе."""
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                Basket.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+        )
+
+    @action(
+        methods=('post',), detail=False, url_path='bulk',
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_create(self, request: WSGIRequest) -> Response:
+        """Создание списка рецептов одним запросом.
+
+        Рецепты проверяются по отдельности (тэги загружаются один раз на
+        весь запрос), корректные записываются вместе в одной транзакции.
+        В ответе результат для каждого элемента в исходном порядке.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': 'Ожидается непустой список рецептов'},
+                status=HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > settings.RECIPES_BULK_MAX_SIZE:
+            return Response(
+                {'error': 'Не больше '
+                          f'{settings.RECIPES_BULK_MAX_SIZE} рецептов'},
+                status=HTTP_400_BAD_REQUEST,
+            )
+        context = {
+            **self.get_serializer_context(), 'tags': Tag.objects.in_bulk(),
+        }
+        names = set(Recipe.objects.filter(
+            author=request.user,
+            name__in=[
+                item.get('name') for item in items if isinstance(item, dict)
+            ],
+        ).values_list('name', flat=True))
+        results, valid = [], []
+        for item in items:
+            serializer = RecipeSerialiser(data=item, context=context)
+            if not serializer.is_valid():
+                results.append({
+                    'status': HTTP_400_BAD_REQUEST,
+                    'errors': serializer.errors,
+                })
+                continue
+            name = serializer.validated_data['name']
+            if name in names:
+                results.append({
+                    'status': HTTP_400_BAD_REQUEST,
+                    'errors': {'name': ['У вас уже есть рецепт '
+                                        'с таким названием']},
+                })
+                continue
+            names.add(name)
+            results.append(None)
+            valid.append(serializer.validated_data)
+        recipes = iter(RecipeSerialiser.bulk_create(valid) if valid else ())
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = {
+                    'status': status.HTTP_201_CREATED,
+                    'recipe': self.add_serializer(next(recipes)).data,
+                }
+        return Response(
+            results,
+            status=status.HTTP_201_CREATED if valid else HTTP_400_BAD_REQUEST,
         )
-        tags: list = self.request.query_params.getlist('tags')
-        if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
-
-        author: str = self.request.query_params.get('author')
-        if author:
-            queryset = queryset.filter(author=author)
-
-        if self.request.user.is_authenticated:
-            is_in_cart: str = self.request.query_params.get(
-                'is_in_shopping_cart')
-            if is_in_cart in ('1', 'true'):
-                queryset = queryset.filter(in_basket__user=self.request.user)
-            if is_in_cart in ('0', 'false'):
-                queryset = queryset.exclude(in_basket__user=self.request.user)
-
-            is_favorite: str = self.request.query_params.get('is_favorited')
-            if is_favorite in ('1', 'true'):
-                queryset = queryset.filter(in_favorite__user=self.request.user)
-            if is_favorite in ('0', 'false'):
-                queryset = queryset.exclude(
-                    in_favorite__user=self.request.user)
-
-        return queryset
 
     @action(detail=True, permission_classes=(IsAuthenticated,))
     def favorite(self, request: WSGIRequest, pk: int | str) -> Response:
@@ -165,16 +357,48 @@ class RecipeViewSet(ModelViewSet, AddDelViewMixin):
     ) -> Response:
         return self._delete_relation(Basket, Q(recipe__id=pk))
 
-    @action(methods=('get',), detail=False)
+    @action(
+        methods=('post', 'delete'), detail=False, url_path='favorite',
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_bulk(self, request: WSGIRequest) -> Response:
+        """Добавление/удаление списка рецептов в избранное."""
+        return self._bulk_relations(Favorite, request)
+
+    @action(
+        methods=('post', 'delete'), detail=False, url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_bulk(self, request: WSGIRequest) -> Response:
+        """Добавление/удаление списка рецептов в список покупок."""
+        response = self._bulk_relations(Basket, request)
+        invalidate_shopping_lists([request.user.pk])
+        return response
+
+    @action(
+        methods=('get',), detail=False, permission_classes=(IsAuthenticated,)
+    )
     def download_shopping_cart(self, request: WSGIRequest) -> Response:
-        """Создание файла *.txt со списком покупок."""
+        """Выгрузка списка покупок в файл *.txt, *.csv или *.pdf."""
         user = self.request.user
+        renderer_class = SHOPPING_LIST_RENDERERS.get(
+            request.query_params.get('filetype', 'txt')
+        )
+        if renderer_class is None:
+            return Response(
+                {'error': 'Поддерживаемые форматы: '
+                          f'{", ".join(SHOPPING_LIST_RENDERERS)}'},
+                status=HTTP_400_BAD_REQUEST,
+            )
         if not user.basket.exists():
             return Response(status=HTTP_400_BAD_REQUEST)
-        filename = f'{user.username}_shopping_list.txt'
-        shopping_list = create_shoping_list(user)
-        response = HttpResponse(
-            shopping_list, content_type='text.txt; charset=utf-8'
+        renderer = renderer_class(user)
+        filename = f'{user.username}_shopping_list.{renderer.extension}'
+        response = StreamingHttpResponse(
+            renderer.render(get_shopping_list_ingredients(user)),
+            content_type=renderer.content_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{filename}"'
         )
-        response['Cotent-Disposition'] = f'attachment; filename={filename}'
         return response
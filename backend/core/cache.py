@@ -0,0 +1,131 @@
+"""Версии данных для инвалидации кэшей и кэш ответов API."""
+from collections import Counter
+from hashlib import md5
+from threading import Lock
+from time import time
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+
+from recipes.models import DataVersion
+
+RESPONSE_KEY = 'response:{name}:{version}:{digest}'
+RESPONSE_STATS_KEY = 'response_stats:{name}:{result}'
+RESPONSE_RESULTS = ('hits', 'misses')
+# Бэкенды с атомарным incr: счётчики в них общие для всех процессов.
+SHARED_STATS_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+_local_stats: Counter = Counter()
+_local_stats_lock = Lock()
+
+
+def get_versions(*names: str) -> tuple[float, ...]:
+    """Текущие версии наборов данных одним запросом.
+
+    Версии хранятся в БД (DataVersion): процесс-локальный кэш не видит
+    изменений из других воркеров и команд импорта, а общий кэш может
+    вытеснить ключ. Отсутствующая версия создаётся с текущим временем.
+    """
+    versions = dict(DataVersion.objects.filter(
+        name__in=names
+    ).values_list('name', 'version'))
+    missing = [name for name in names if name not in versions]
+    if missing:
+        DataVersion.objects.bulk_create(
+            (DataVersion(name=name, version=time()) for name in missing),
+            ignore_conflicts=True,
+        )
+        versions.update(DataVersion.objects.filter(
+            name__in=missing
+        ).values_list('name', 'version'))
+    return tuple(versions[name] for name in names)
+
+
+def get_version(name: str) -> float:
+    """Текущая версия набора данных (время последнего изменения)."""
+    return get_versions(name)[0]
+
+
+def bump_version(name: str) -> float:
+    """Отметка об изменении набора данных."""
+    version = time()
+    DataVersion.objects.bulk_create(
+        (DataVersion(name=name, version=version),),
+        update_conflicts=True,
+        unique_fields=('name',),
+        update_fields=('version',),
+    )
+    return version
+
+
+def get_response_cache() -> BaseCache:
+    """Кэш ответов, псевдоним задаётся RESPONSE_CACHE_ALIAS."""
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def get_response_key(name: str, params: Iterable) -> str:
+    """Ключ ответа: параметры запроса и текущая версия данных.
+
+    После bump_version(name) старые ключи больше не читаются и
+    вытесняются из кэша по таймауту.
+    """
+    digest = md5(
+        repr(tuple(params)).encode(), usedforsecurity=False
+    ).hexdigest()
+    return RESPONSE_KEY.format(
+        name=name, version=get_version(name), digest=digest
+    )
+
+
+def has_shared_response_stats() -> bool:
+    """Счётчики кэша ответов общие для процессов (атомарный incr)."""
+    backend = settings.CACHES[settings.RESPONSE_CACHE_ALIAS]['BACKEND']
+    return backend in SHARED_STATS_BACKENDS
+
+
+def count_response(name: str, result: str) -> None:
+    """Учёт попадания (hits) или промаха (misses) кэша ответов.
+
+    На бэкендах без атомарного incr (локальная память, файлы, БД)
+    счётчики ведутся в памяти процесса: add/incr там теряют обновления
+    между процессами, а у файлового кэша ещё и просматривают весь
+    каталог при каждой записи.
+    """
+    if not has_shared_response_stats():
+        with _local_stats_lock:
+            _local_stats[name, result] += 1
+        return
+    key = RESPONSE_STATS_KEY.format(name=name, result=result)
+    response_cache = get_response_cache()
+    if not response_cache.add(key, 1, None):
+        response_cache.incr(key)
+
+
+def get_response_stats(name: str) -> dict[str, int]:
+    if not has_shared_response_stats():
+        return {
+            result: _local_stats[name, result] for result in RESPONSE_RESULTS
+        }
+    keys = {
+        RESPONSE_STATS_KEY.format(name=name, result=result): result
+        for result in RESPONSE_RESULTS
+    }
+    values = get_response_cache().get_many(keys)
+    return {result: values.get(key, 0) for key, result in keys.items()}
+
+
+def reset_response_stats(name: str) -> None:
+    if not has_shared_response_stats():
+        with _local_stats_lock:
+            for result in RESPONSE_RESULTS:
+                _local_stats.pop((name, result), None)
+        return
+    get_response_cache().delete_many([
+        RESPONSE_STATS_KEY.format(name=name, result=result)
+        for result in RESPONSE_RESULTS
+    ])
@@ -0,0 +1,138 @@
+"""Поиск ингредиентов для автодополнения."""
+from bisect import bisect_left
+from threading import Lock
+from types import MappingProxyType
+from typing import Iterable, Mapping, NamedTuple
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import (
+    Case, F, IntegerField, Q, QuerySet, Value, When,
+)
+from django.db.models.functions import Collate, Lower
+
+from core.cache import get_version
+from core.utilities import keyboard_layout_variants
+from recipes.models import Ingredient
+
+
+def search_ingredients(
+    queryset: QuerySet[Ingredient], name: str
+) -> QuerySet[Ingredient]:
+    """Поиск ингредиентов по части названия в обеих раскладках.
+
+    Поиск идёт по LOWER(name) обычным LIKE: на PostgreSQL такие
+    условия обслуживают trigram GIN и префиксный индексы по этому
+    выражению (миграция 0011). Все варианты строки проверяются одним
+    запросом; порядок: совпадения с начала названия, затем остальные,
+    внутри группы введённый текст раньше варианта в другой раскладке,
+    дальше по названию в нижнем регистре и id - как в IngredientIndex.
+    """
+    variants = keyboard_layout_variants(name)
+    matches = Q()
+    prefix_ranks = []
+    contains_ranks = []
+    for rank, variant in enumerate(variants):
+        matches |= Q(lower_name__contains=variant)
+        prefix_ranks.append(
+            When(lower_name__startswith=variant, then=Value(rank))
+        )
+        contains_ranks.append(
+            When(
+                lower_name__contains=variant,
+                then=Value(len(variants) + rank),
+            )
+        )
+    order_name = F('lower_name')
+    if connections[queryset.db].vendor == 'postgresql':
+        # Побайтовое сравнение, как у str в IngredientIndex.
+        order_name = Collate(order_name, 'C')
+    return queryset.annotate(
+        lower_name=Lower('name')
+    ).filter(
+        matches
+    ).annotate(
+        rank=Case(*prefix_ranks, *contains_ranks, output_field=IntegerField())
+    ).order_by(
+        'rank', order_name, 'pk'
+    )[:settings.INGREDIENT_SEARCH_LIMIT]
+
+
+class IndexSnapshot(NamedTuple):
+    """Неизменяемое состояние IngredientIndex для одной версии."""
+
+    version: float | None
+    names: tuple[str, ...]
+    ingredients: tuple[Ingredient, ...]
+    by_id: Mapping[int, Ingredient]
+
+
+class IngredientIndex:
+    """Отсортированный индекс ингредиентов в памяти процесса.
+
+    Строится при первом обращении и перестраивается, когда меняется
+    версия 'ingredients' (см. recipes.signals). Версия читается из БД
+    при каждом обращении, поэтому изменения из других процессов видны
+    сразу. Перестроенный индекс подменяется одним присваиванием
+    снимка, поэтому читатели без блокировки не видят смесь версий.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._snapshot = IndexSnapshot(None, (), (), MappingProxyType({}))
+
+    def _load(self) -> IndexSnapshot:
+        version = get_version('ingredients')
+        snapshot = self._snapshot
+        if snapshot.version == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot.version != version:
+                ingredients = tuple(sorted(
+                    Ingredient.objects.all(),
+                    key=lambda ingredient: (
+                        ingredient.name.lower(), ingredient.pk
+                    ),
+                ))
+                snapshot = IndexSnapshot(
+                    version,
+                    tuple(
+                        ingredient.name.lower() for ingredient in ingredients
+                    ),
+                    ingredients,
+                    MappingProxyType({
+                        ingredient.pk: ingredient for ingredient in ingredients
+                    }),
+                )
+                self._snapshot = snapshot
+        return snapshot
+
+    def search(self, name: str) -> list[Ingredient]:
+        """Поиск в обеих раскладках, порядок как в search_ingredients."""
+        variants = keyboard_layout_variants(name)
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        _, names, ingredients, _ = self._load()
+        found: dict[int, Ingredient] = {}
+        for variant in variants:
+            position = bisect_left(names, variant)
+            while (position < len(names)
+                   and names[position].startswith(variant)
+                   and len(found) < limit):
+                found.setdefault(position, ingredients[position])
+                position += 1
+        for variant in variants:
+            for position, ingredient_name in enumerate(names):
+                if len(found) >= limit:
+                    break
+                if variant in ingredient_name:
+                    found.setdefault(position, ingredients[position])
+        return list(found.values())
+
+    def get_many(self, ids: Iterable[int]) -> dict[int, Ingredient]:
+        """Ингредиенты по id; отсутствующих в индексе нет в словаре."""
+        by_id = self._load().by_id
+        return {pk: by_id[pk] for pk in ids if pk in by_id}
+
+
+ingredient_index = IngredientIndex()
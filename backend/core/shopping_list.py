@@ -0,0 +1,198 @@
+"""Выгрузка списка покупок в разных форматах."""
+import csv
+import os
+from datetime import datetime as dt
+from io import BytesIO
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+from core.cache import get_version
+from recipes.models import AmountIngredient, Basket
+
+if TYPE_CHECKING:
+    from users.models import CustomUser
+
+SHOPPING_LIST_CACHE_KEY = 'shopping_list:{version}:{user_id}'
+FOOTER = (
+    'Составлено в Foodgram.',
+    'Автор - студент 26 когорты Евгений Иванов.',
+)
+
+
+def get_cache_key(user_id: int, version: float | None = None) -> str:
+    """Ключ списка покупок; version - уже прочитанная версия ингредиентов."""
+    if version is None:
+        version = get_version('ingredients')
+    return SHOPPING_LIST_CACHE_KEY.format(version=version, user_id=user_id)
+
+
+def get_shopping_list_ingredients(user: 'CustomUser') -> list[dict]:
+    """Суммарное количество ингредиентов из корзины пользователя.
+
+    Агрегация выполняется в БД. Результат - не больше строки на
+    ингредиент - загружается целиком и кэшируется для пользователя до
+    изменения его корзины или ингредиентов рецептов из неё (см.
+    recipes.signals); потоково отдаётся уже готовый список.
+    """
+    cache_key = get_cache_key(user.pk)
+    ingredients = cache.get(cache_key)
+    if ingredients is None:
+        ingredients = list(
+            AmountIngredient.objects.filter(recipe__in_basket__user=user)
+            .values(
+                name=F('ingredients__name'),
+                measurement=F('ingredients__measurement_unit'),
+            )
+            .annotate(amount=Sum('amount'))
+            .order_by('name')
+        )
+        cache.set(
+            cache_key, ingredients, settings.SHOPPING_LIST_CACHE_TIMEOUT
+        )
+    return ingredients
+
+
+def invalidate_shopping_lists(user_ids: Iterable[int]) -> None:
+    """Сброс кэша списков покупок пользователей.
+
+    Версия ингредиентов читается один раз на все ключи.
+    """
+    version = get_version('ingredients')
+    cache.delete_many(
+        [get_cache_key(user_id, version) for user_id in user_ids]
+    )
+
+
+def invalidate_recipes_shopping_lists(recipe_ids: Iterable[int]) -> None:
+    """Сброс кэша у всех, у кого рецепты лежат в корзине."""
+    invalidate_shopping_lists(
+        Basket.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('user_id', flat=True).distinct()
+    )
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+class ShoppingListRenderer:
+    """Базовый формат файла списка покупок."""
+
+    extension: str = ''
+    content_type: str = ''
+
+    def __init__(self, user: 'CustomUser') -> None:
+        self.user = user
+
+    def get_header(self) -> tuple[str, str]:
+        return (
+            f'Список покупок для пользователя: {self.user.first_name}',
+            dt.now().strftime(settings.DATETIME_FORMAT),
+        )
+
+    def render(self, ingredients: Iterable[dict]) -> Iterator[str | bytes]:
+        raise NotImplementedError
+
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+    extension = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def render(self, ingredients: Iterable[dict]) -> Iterator[str]:
+        yield '\n'.join(self.get_header()) + '\n\n'
+        for ingredient in ingredients:
+            yield (
+                f'{ingredient["name"]}: {ingredient["amount"]} '
+                f'{ingredient["measurement"]}\n'
+            )
+        yield '\n' + '\n'.join(FOOTER) + '\n'
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def render(self, ingredients: Iterable[dict]) -> Iterator[str]:
+        writer = csv.writer(Echo())
+        yield writer.writerow(('Ингредиент', 'Количество', 'Единица'))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['name'],
+                ingredient['amount'],
+                ingredient['measurement'],
+            ))
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+    """PDF собирается целиком: формат не позволяет отдавать его частями.
+
+    Для кириллицы нужен TTF-шрифт из SHOPPING_LIST_PDF_FONT, без него
+    используется встроенный Helvetica.
+    """
+
+    extension = 'pdf'
+    content_type = 'application/pdf'
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    line_height = 18
+    margin = 50
+
+    def get_font(self) -> str:
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if not font_path or not os.path.exists(font_path):
+            return 'Helvetica'
+        pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        return self.font_name
+
+    def render(self, ingredients: Iterable[dict]) -> Iterator[bytes]:
+        buffer = BytesIO()
+        canvas = Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        _, height = A4
+        y = height - self.margin
+
+        def write_line(text: str) -> None:
+            nonlocal y
+            if y < self.margin:
+                canvas.showPage()
+                y = height - self.margin
+            canvas.setFont(font, self.font_size)
+            canvas.drawString(self.margin, y, text)
+            y -= self.line_height
+
+        for line in self.get_header():
+            write_line(line)
+        write_line('')
+        for ingredient in ingredients:
+            write_line(
+                f'{ingredient["name"]}: {ingredient["amount"]} '
+                f'{ingredient["measurement"]}'
+            )
+        write_line('')
+        for line in FOOTER:
+            write_line(line)
+        canvas.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_LIST_RENDERERS: dict[str, type[ShoppingListRenderer]] = {
+    renderer.extension: renderer
+    for renderer in (
+        TxtShoppingListRenderer,
+        CsvShoppingListRenderer,
+        PdfShoppingListRenderer,
+    )
+}
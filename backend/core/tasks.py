@@ -0,0 +1,49 @@
+"""Фоновое выполнение задач вне потока запроса."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.transaction import on_commit
+
+logger = logging.getLogger(__name__)
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_TASKS_WORKERS,
+            thread_name_prefix='foodgram-task',
+        )
+    return _executor
+
+
+def _run(task: Callable, *args) -> None:
+    """Выполнение задачи в потоке пула со своим соединением с БД.
+
+    Future из пула никто не ждёт, поэтому ошибки задачи пишутся в лог.
+    """
+    close_old_connections()
+    try:
+        task(*args)
+    except Exception:
+        logger.exception('Ошибка фоновой задачи %s%r', task.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def run_in_background(task: Callable, *args) -> None:
+    """Запуск задачи после фиксации текущей транзакции.
+
+    BACKGROUND_TASKS_BACKEND: 'thread' - пул потоков процесса,
+    'sync' - сразу в текущем потоке (удобно для отладки и команд).
+    """
+    if settings.BACKGROUND_TASKS_BACKEND == 'sync':
+        on_commit(partial(task, *args))
+        return
+    on_commit(partial(_get_executor().submit, _run, task, *args))
@@ -1,16 +1,27 @@
 """Вспомогательные утилиты."""
-from datetime import datetime as dt
 from typing import TYPE_CHECKING
+from functools import partial
 from urllib.parse import unquote
 
-from django.conf import settings
-from django.db.models import F, Sum
+from django.db.models import Prefetch
+from django.db.transaction import on_commit
 
+from core.cache import bump_version
+from core.shopping_list import invalidate_recipes_shopping_lists
 from recipes.models import AmountIngredient, Recipe
 
 if TYPE_CHECKING:
     from recipes.models import Ingredient
-    from users.models import CustomUser
+
+
+def recipe_ingredients_prefetch() -> Prefetch:
+    """Ингредиенты рецептов с количеством, по названию ингредиента."""
+    return Prefetch(
+        'ingredient',
+        AmountIngredient.objects.select_related('ingredients').order_by(
+            'ingredients__name'
+        ),
+    )
 
 
 def recipe_ingredients_set(
@@ -25,38 +36,72 @@ def recipe_ingredients_set(
             )
         )
     AmountIngredient.objects.bulk_create(objs)
+    on_commit(partial(invalidate_recipes_shopping_lists, [recipe.pk]))
+    on_commit(partial(bump_version, 'recipes'))
 
 
-def create_shoping_list(user: 'CustomUser') -> str:
-    """Формирование списка продуктов для покупки."""
-    shopping_list = [
-        f'Список покупок для пользователя: {user.first_name}'
-        f'\n{dt.now().strftime(settings.DATETIME_FORMAT)}\n'
-    ]
-    ingredients = (
-        AmountIngredient.objects.filter(recipe__in_basket__user=user)
-        .values('ingredients__name',
-                measurement=F('ingredients__measurement_unit'))
-        .annotate(amount=Sum('amount'))
-    )
-    ingredients_list = (
-        f'{ingredient["ingredients__name"]}: {ingredient["amount"]} '
-        f'{ingredient["measurement"]}'
-        for ingredient in ingredients
-    )
-    shopping_list.extend(ingredients_list)
-    shopping_list.append(
-        '\n Составлено в Foodgram.\n'
-        'Автор - студент 26 когорты Евгений Иванов.')
-    return "\n".join(shopping_list)
-
-
-def incorrect_keyboard_layout(url_string: str) -> str:
-    """Перевод слов, если не переключена раскладка."""
-    equals = str.maketrans(
-        "qwertyuiop[]asdfghjkl;'zxcvbnm,./",
-        "йцукенгшщзхъфывапролджэячсмитьбю.",
-    )
+def recipe_ingredients_update(
+        recipe: Recipe, ingredients: dict[int, tuple['Ingredient', int]]
+) -> None:
+    """Изменение ингредиентов рецепта по разнице с записанными.
+
+    Не больше трёх изменяющих запросов: удаление убранных, bulk_update
+    изменившихся количеств и bulk_create добавленных; строки без
+    изменений не трогаются.
+    """
+    current = {
+        row.ingredients_id: row
+        for row in AmountIngredient.objects.filter(recipe=recipe).only(
+            'id', 'ingredients_id', 'amount'
+        )
+    }
+    new, changed = [], []
+    for ingredient, amount in ingredients.values():
+        row = current.pop(ingredient.pk, None)
+        if row is None:
+            new.append(AmountIngredient(
+                recipe=recipe, ingredients=ingredient, amount=amount
+            ))
+        elif row.amount != amount:
+            row.amount = amount
+            changed.append(row)
+    if current:
+        AmountIngredient.objects.filter(
+            pk__in=[row.pk for row in current.values()]
+        ).delete()
+    if changed:
+        AmountIngredient.objects.bulk_update(changed, ('amount',))
+    if new:
+        AmountIngredient.objects.bulk_create(new)
+    if current or changed or new:
+        on_commit(partial(invalidate_recipes_shopping_lists, [recipe.pk]))
+        on_commit(partial(bump_version, 'recipes'))
+
+
+LATIN_LAYOUT = "qwertyuiop[]asdfghjkl;'zxcvbnm,"
+CYRILLIC_LAYOUT = "йцукенгшщзхъфывапролджэячсмитьб"
+LATIN_TO_CYRILLIC = str.maketrans(
+    LATIN_LAYOUT + '.', CYRILLIC_LAYOUT + 'ю'
+)
+CYRILLIC_TO_LATIN = str.maketrans(
+    CYRILLIC_LAYOUT + 'ю', LATIN_LAYOUT + '.'
+)
+
+
+def keyboard_layout_variants(url_string: str) -> list[str]:
+    """Строка поиска и её вариант в другой раскладке клавиатуры.
+
+    Первым идёт введённый текст, затем набранный в другой раскладке
+    (латиница -> кириллица и наоборот), без повторов.
+    """
     if url_string.startswith('%'):
-        return unquote(url_string).lower()
-    return url_string.translate(equals).lower()
+        return [unquote(url_string).lower()]
+    original = url_string.lower()
+    variants = [original]
+    for swapped in (
+        original.translate(LATIN_TO_CYRILLIC),
+        original.translate(CYRILLIC_TO_LATIN),
+    ):
+        if swapped not in variants:
+            variants.append(swapped)
+    return variants
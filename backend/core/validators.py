@@ -1,10 +1,11 @@
 from re import compile
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Iterable
 
 from django.core.exceptions import ValidationError
 from django.utils.deconstruct import deconstructible
 
 if TYPE_CHECKING:
+    from core.search import IngredientIndex
     from recipes.models import Ingredient, Tag
 
 
@@ -55,17 +56,45 @@ class ColorValidator:
         return '#' + color.upper()
 
 
+def parse_ids(values: Iterable) -> tuple[list[int], list[str]]:
+    """Уникальные id в исходном порядке и значения, не являющиеся id."""
+    ids, invalid = {}, []
+    for value in values:
+        if isinstance(value, int) and not isinstance(value, bool):
+            ids[value] = None
+        elif isinstance(value, str) and value.isdigit():
+            ids[int(value)] = None
+        else:
+            invalid.append(str(value))
+    return list(ids), invalid
+
+
 class TagsValidator:
 
     @staticmethod
-    def validate(tags_ids, tag) -> list['Tag']:
-        """Проверка существования тэгов с указанными id."""
-        if not tags_ids:
+    def validate(
+        tags_ids: list,
+        tag: 'type[Tag]',
+        known: dict[int, 'Tag'] | None = None,
+    ) -> list['Tag']:
+        """Проверка тэгов одним запросом, повторы id не ошибка.
+
+        known - уже загруженные тэги {id: тэг}, из БД запрашиваются
+        только отсутствующие в нём.
+        """
+        if not tags_ids or not isinstance(tags_ids, list):
             raise ValidationError('Тэгов нет')
-        tags = tag.objects.filter(id__in=tags_ids)
-        if tags.count() != len(tags_ids):
-            raise ValidationError('Указанный тэг не существует')
-        return tags
+        ids, invalid = parse_ids(tags_ids)
+        tags = dict(known or {})
+        missing = [pk for pk in ids if pk not in tags]
+        if missing:
+            tags.update(tag.objects.in_bulk(missing))
+        invalid.extend(str(pk) for pk in ids if pk not in tags)
+        if invalid:
+            raise ValidationError(
+                f'Указанные тэги не существуют: {", ".join(invalid)}'
+            )
+        return [tags[pk] for pk in ids]
 
 
 class IngredientsValidator:
@@ -73,26 +102,46 @@ class IngredientsValidator:
     @staticmethod
     def validate(
         ingredients: list[dict[str, str | int]],
-        ingredient_model: 'Ingredient',
+        ingredient_model: 'type[Ingredient]',
+        index: 'IngredientIndex | None' = None,
     ) -> dict[int, tuple['Ingredient', int]]:
-        """Проверка списка ингредиентов."""
-        if not ingredients:
+        """Проверка списка ингредиентов.
+
+        Ингредиенты берутся из индекса в памяти, в БД запрашиваются
+        только отсутствующие в нём. Сообщения обо всех неверных id и
+        количествах собираются в одну ошибку. При повторе id
+        используется последнее количество.
+        """
+        if not ingredients or not isinstance(ingredients, list):
             raise ValidationError('Не указано ни одного ингредиента')
-        valid_ingredients = {}
-        for ingredient in ingredients:
-            if not (isinstance(ingredient['amount'], int)
-                    or ingredient['amount'].isdigit()):
-                raise ValidationError('Проверьте количество ингредиента')
-            valid_ingredients[ingredient['id']] = int(ingredient['amount'])
-            if valid_ingredients[ingredient['id']] <= 0:
-                raise ValidationError('Проверьте количество ингредиента')
-        if not valid_ingredients:
-            raise ValidationError('Неправильные ингредиенты')
-        db_inredients = ingredient_model.objects.filter(
-            pk__in=valid_ingredients.keys())
-        if not db_inredients:
-            raise ValidationError('Неправильные ингредиенты')
-        for ingredient in db_inredients:
-            valid_ingredients[ingredient.pk] = (
-                ingredient, valid_ingredients[ingredient.pk])
-        return valid_ingredients
+        errors, amounts = [], {}
+        for item in ingredients:
+            if not isinstance(item, dict):
+                errors.append(f'Неверный ингредиент: {item}')
+                continue
+            ids, invalid = parse_ids((item.get('id'),))
+            if invalid:
+                errors.append(f'Неверный id ингредиента: {invalid[0]}')
+                continue
+            amount = item.get('amount')
+            if isinstance(amount, str) and amount.isdigit():
+                amount = int(amount)
+            if (not isinstance(amount, int) or isinstance(amount, bool)
+                    or amount <= 0):
+                errors.append(
+                    f'Проверьте количество ингредиента {ids[0]}: {amount}'
+                )
+                continue
+            amounts[ids[0]] = amount
+        found = index.get_many(amounts) if index is not None else {}
+        missing = [pk for pk in amounts if pk not in found]
+        if missing:
+            found.update(ingredient_model.objects.in_bulk(missing))
+        unknown = [str(pk) for pk in amounts if pk not in found]
+        if unknown:
+            errors.append(
+                f'Ингредиенты не существуют: {", ".join(unknown)}'
+            )
+        if errors:
+            raise ValidationError(errors)
+        return {pk: (found[pk], amount) for pk, amount in amounts.items()}
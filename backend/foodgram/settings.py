@@ -81,6 +81,15 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -114,7 +123,7 @@ DJOSER = {
         'user': 'api.serializers.UserSerializer',
         'user_create': 'api.serializers.UserSerializer',
         'current_user': 'api.serializers.UserSerializer',
-        'user_list': 'api.serialiser.UserSerializer',
+        'user_list': 'api.serializers.UserSerializer',
     },
     'PERMISSIONS': {
         'user': ('api.permission.AuthorOrAdmin',),
@@ -152,3 +161,25 @@ MIN_COOKING_TIME = 1
 MAX_AMOUNT_INGREDIENTS = 5000
 MIN_AMOUNT_INGREDIENTS = 1
 PAGE_SIZE = 6
+RECIPES_BULK_MAX_SIZE = 500
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = 100_000
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_SEARCH_BACKEND = os.getenv('INGREDIENT_SEARCH_BACKEND', 'memory')
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+RESPONSE_CACHE_ALIAS = os.getenv('RESPONSE_CACHE_ALIAS', 'default')
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+BACKGROUND_TASKS_BACKEND = os.getenv('BACKGROUND_TASKS_BACKEND', 'thread')
+BACKGROUND_TASKS_WORKERS = int(os.getenv('BACKGROUND_TASKS_WORKERS', 2))
+RECIPE_IMAGE_RENDITIONS = {
+    'thumbnail': (150, 150),
+    'card': (500, 500),
+    'full': (1280, 1280),
+}
+RECIPE_IMAGE_QUALITY = 85
+MAX_IMAGE_UPLOAD_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_SIDE = 8000
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
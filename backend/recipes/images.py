@@ -0,0 +1,58 @@
+"""Подготовка изображений рецептов в нескольких размерах."""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+RENDITIONS_DIR = 'renditions'
+FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+
+def get_rendition_name(image_name: str, rendition: str, extension: str) -> str:
+    """Имя файла размера изображения рядом с исходным."""
+    stem, _ = os.path.splitext(os.path.basename(image_name))
+    return os.path.join(
+        RENDITIONS_DIR, f'{stem}_{rendition}.{extension}'
+    )
+
+
+def _save(name: str, image: Image.Image, image_format: str) -> None:
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=settings.RECIPE_IMAGE_QUALITY)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def process_recipe_image(recipe_id: int) -> None:
+    """Создание размеров изображения и уменьшение исходного файла.
+
+    Исходный файл, как и раньше, вписывается в размер 'card'.
+    """
+    from .models import Recipe
+
+    image_name = Recipe.objects.filter(
+        pk=recipe_id
+    ).values_list('image', flat=True).first()
+    if not image_name:
+        return
+    with default_storage.open(image_name, 'rb') as file:
+        original = Image.open(file)
+        original.load()
+    original_format = original.format
+    for rendition, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+        image = original.copy()
+        image.thumbnail(size)
+        for extension, image_format in FORMATS.items():
+            _save(
+                get_rendition_name(image_name, rendition, extension),
+                image,
+                image_format,
+            )
+    original.thumbnail(settings.RECIPE_IMAGE_RENDITIONS['card'])
+    _save(image_name, original, original_format)
@@ -1,57 +1,174 @@
 import csv
+import json
 import os
+from itertools import islice
+from time import perf_counter
+from typing import Iterable, Iterator
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Model
+from django.db.transaction import atomic
 
+from core.cache import bump_version
 from recipes.models import Ingredient, Tag
 
 NAME_MODEL_FILE = {
     'ingredient': (Ingredient, 'ingredients.csv'),
     'tags': (Tag, 'tag.csv'),
 }
+# Поля строки файла, поля уникального ключа и обновляемые поля.
+MODEL_FIELDS = {
+    Ingredient: (
+        ('name', 'measurement_unit'), ('name', 'measurement_unit'), (),
+    ),
+    Tag: (('name', 'color', 'slug'), ('slug',), ('name', 'color')),
+}
+# Версии данных (core.cache), которые сбрасывает загрузка: bulk_create
+# не отправляет сигналы, а названия выводятся и в рецептах.
+MODEL_VERSIONS = {
+    Ingredient: ('ingredients', 'recipes'),
+    Tag: ('tags', 'recipes'),
+}
+BATCH_SIZE = 1000
 
 
 class Command(BaseCommand):
-    help = 'Load data from csv file to model.'
+    help = (
+        'Load data from csv/json/jsonl files to models. '
+        'Existing rows are kept and updated, new rows are inserted.'
+    )
 
     @staticmethod
     def get_csv_file(filename):
         return os.path.join(settings.BASE_DIR, 'data', filename)
 
-    @staticmethod
-    def clear_model(model):
-        model.objects.all().delete()
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*',
+            help=f'Модели для загрузки ({", ".join(NAME_MODEL_FILE)}), '
+                 'по умолчанию все.',
+        )
+        parser.add_argument(
+            '--file', help='Файл вместо стандартного (для одной модели).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Строк в одной пачке запросов.',
+        )
 
     def print_to_terminal(self, message):
         self.stdout.write(self.style.SUCCESS(message))
 
-    def load_model(self, model_name, field_names):
-        model, file_path = NAME_MODEL_FILE.get(model_name)
-        with open(self.get_csv_file(file_path), encoding='utf-8') as file:
-            reader = csv.reader(file, delimiter=',')
-            self.clear_model(model)
-            line = 0
-            for row in reader:
-                if ','.join(row).strip() and line >= 0:
-                    params = dict(zip(field_names, row))
-                    _, created = model.objects.get_or_create(**params)
-                line += 1
-        self.print_to_terminal(f'{line} objects added to {model_name}')
-
-    def load_ingredient(self):
-        self.load_model(
-            'ingredient', ['name', 'measurement_unit']
-        )
+    @staticmethod
+    def read_rows(file_path: str, field_names: tuple) -> Iterator[dict]:
+        """Построчное чтение csv, jsonl или json-массива."""
+        extension = os.path.splitext(file_path)[1].lower()
+        with open(file_path, encoding='utf-8') as file:
+            if extension == '.csv':
+                for row in csv.reader(file, delimiter=','):
+                    if ','.join(row).strip():
+                        yield dict(zip(field_names, row))
+            elif extension == '.jsonl':
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+            elif extension == '.json':
+                yield from json.load(file)
+            else:
+                raise CommandError(f'Неизвестный формат файла {file_path}')
+
+    @staticmethod
+    def clean_rows(
+        rows: Iterable[dict], field_names: tuple, unique_fields: tuple
+    ) -> Iterator[dict | None]:
+        """Обрезка пробелов; None для строк без обязательных полей."""
+        for row in rows:
+            row = {
+                field: str(row.get(field) or '').strip()
+                for field in field_names
+            }
+            if all(row[field] for field in unique_fields):
+                yield row
+            else:
+                yield None
 
-    def load_tags(self):
-        self.load_model(
-            'tags', ['name', 'color', 'slug']
+    @staticmethod
+    def load_batch(
+        model: Model, rows: list[dict], unique_fields: tuple,
+        update_fields: tuple,
+    ) -> tuple[int, int, int]:
+        """Upsert пачки строк: (добавлено, обновлено, пропущено)."""
+        batch = {}
+        for row in rows:
+            batch[tuple(row[field] for field in unique_fields)] = row
+        skipped = len(rows) - len(batch)
+        first_field = unique_fields[0]
+        existing = {
+            tuple(row[field] for field in unique_fields): row
+            for row in model.objects.filter(**{
+                f'{first_field}__in': {row[first_field] for row in rows}
+            }).values(*unique_fields, *update_fields)
+        }
+        new, changed = [], []
+        for key, row in batch.items():
+            if key not in existing:
+                new.append(model(**row))
+            elif any(
+                existing[key][field] != row[field] for field in update_fields
+            ):
+                changed.append(model(**row))
+            else:
+                skipped += 1
+        with atomic():
+            model.objects.bulk_create(new, ignore_conflicts=True)
+            if changed:
+                model.objects.bulk_create(
+                    changed,
+                    update_conflicts=True,
+                    unique_fields=unique_fields,
+                    update_fields=update_fields,
+                )
+        return len(new), len(changed), skipped
+
+    def load_model(self, model_name, file_path=None, batch_size=BATCH_SIZE):
+        model, filename = NAME_MODEL_FILE.get(model_name)
+        field_names, unique_fields, update_fields = MODEL_FIELDS[model]
+        file_path = file_path or self.get_csv_file(filename)
+        inserted = updated = skipped = 0
+        started = perf_counter()
+        rows = self.clean_rows(
+            self.read_rows(file_path, field_names), field_names, unique_fields
+        )
+        while batch := list(islice(rows, batch_size)):
+            valid = [row for row in batch if row is not None]
+            skipped += len(batch) - len(valid)
+            if not valid:
+                continue
+            batch_inserted, batch_updated, batch_skipped = self.load_batch(
+                model, valid, unique_fields, update_fields
+            )
+            inserted += batch_inserted
+            updated += batch_updated
+            skipped += batch_skipped
+        if inserted or updated:
+            for name in MODEL_VERSIONS[model]:
+                bump_version(name)
+        elapsed = perf_counter() - started
+        total = inserted + updated + skipped
+        self.print_to_terminal(
+            f'{model_name}: {inserted} inserted, {updated} updated, '
+            f'{skipped} skipped ({total / elapsed:.0f} rows/s)'
         )
 
-    def handle(self, *args, **kwargs):
-        self.load_ingredient()
-        self.load_tags()
+    def handle(self, *args, **options):
+        model_names = options['models'] or list(NAME_MODEL_FILE)
+        unknown = set(model_names) - set(NAME_MODEL_FILE)
+        if unknown:
+            raise CommandError(f'Unknown models: {", ".join(unknown)}')
+        if options['file'] and len(model_names) != 1:
+            raise CommandError('--file requires exactly one model name')
+        for model_name in model_names:
+            self.load_model(
+                model_name, options['file'], options['batch_size']
+            )
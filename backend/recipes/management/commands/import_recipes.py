@@ -0,0 +1,278 @@
+import json
+import os
+from multiprocessing import get_context
+from time import perf_counter
+from typing import Iterator
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.transaction import atomic
+
+from core.cache import bump_version
+from recipes.models import AmountIngredient, Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+MAX_ERRORS_SHOWN = 10
+
+# Таблицы соответствия имён и id, общие для процессов пула.
+lookups: dict[str, dict] = {}
+
+
+def build_lookups() -> dict[str, dict]:
+    """Словари имя -> id для авторов, тэгов и ингредиентов."""
+    authors = {}
+    for pk, username, email in User.objects.values_list(
+            'pk', 'username', 'email'):
+        authors[username] = pk
+        authors[email] = pk
+    tags = {}
+    for pk, name, slug in Tag.objects.values_list('pk', 'name', 'slug'):
+        tags[name] = pk
+        tags[slug] = pk
+    ingredients = {
+        (name.lower(), unit.lower()): pk
+        for pk, name, unit in Ingredient.objects.values_list(
+            'pk', 'name', 'measurement_unit')
+    }
+    return {'authors': authors, 'tags': tags, 'ingredients': ingredients}
+
+
+def init_worker(shared_lookups: dict[str, dict]) -> None:
+    """Подготовка процесса пула: свои соединения с БД и таблицы."""
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+    lookups.update(shared_lookups)
+
+
+def read_batch(file_path: str, offset: int, size: int) -> Iterator[str]:
+    with open(file_path, 'rb') as file:
+        file.seek(offset)
+        for _ in range(size):
+            line = file.readline()
+            if not line:
+                break
+            yield line.decode('utf-8')
+
+
+def int_in_range(field: str, value, minimum: int, maximum: int) -> int:
+    """Целое в границах валидаторов модели, иначе ValueError."""
+    value = int(value)
+    if not minimum <= value <= maximum:
+        raise ValueError(
+            f'{field} {value} is out of range {minimum}..{maximum}'
+        )
+    return value
+
+
+def parse_recipe(line: str) -> tuple[Recipe, list[int], dict[int, int]]:
+    """Рецепт, id тэгов и {id ингредиента: количество} из строки.
+
+    Значения проверяются по тем же границам, что и валидаторы модели:
+    bulk_create их не вызывает, а ошибка БД прервала бы весь импорт.
+    """
+    data = json.loads(line)
+    name = data['name'].strip()
+    max_length = Recipe._meta.get_field('name').max_length
+    if not name or len(name) > max_length:
+        raise ValueError(f'name must be 1..{max_length} characters')
+    author = lookups['authors'].get(data.get('author'))
+    if author is None:
+        raise ValueError(f'unknown author {data.get("author")!r}')
+    tags = []
+    for tag in data.get('tags', ()):
+        if tag not in lookups['tags']:
+            raise ValueError(f'unknown tag {tag!r}')
+        tags.append(lookups['tags'][tag])
+    ingredients = {}
+    for item in data.get('ingredients', ()):
+        key = (item['name'].lower(), item['measurement_unit'].lower())
+        if key not in lookups['ingredients']:
+            raise ValueError(f'unknown ingredient {key!r}')
+        ingredients[lookups['ingredients'][key]] = int_in_range(
+            'amount', item['amount'],
+            settings.MIN_AMOUNT_INGREDIENTS, settings.MAX_AMOUNT_INGREDIENTS,
+        )
+    if not tags or not ingredients:
+        raise ValueError('recipe without tags or ingredients')
+    recipe = Recipe(
+        name=name,
+        author_id=author,
+        text=data.get('text', ''),
+        cooking_time=int_in_range(
+            'cooking_time', data['cooking_time'],
+            settings.MIN_COOKING_TIME, settings.MAX_COOKING_TIME,
+        ),
+        image=data.get('image', ''),
+    )
+    return recipe, tags, ingredients
+
+
+def import_batch(
+    file_path: str, index: int, offset: int, size: int
+) -> tuple[int, int, int, list[str]]:
+    """Запись пачки рецептов: (номер, добавлено, пропущено, ошибки)."""
+    parsed, errors = {}, []
+    for line_number, line in enumerate(
+            read_batch(file_path, offset, size), index * size + 1):
+        if not line.strip():
+            continue
+        try:
+            recipe, tags, ingredients = parse_recipe(line)
+        except (ValueError, KeyError, TypeError) as error:
+            errors.append(f'line {line_number}: {error}')
+            continue
+        parsed[(recipe.name, recipe.author_id)] = (recipe, tags, ingredients)
+    with atomic():
+        existing = set(Recipe.objects.filter(
+            name__in={name for name, _ in parsed},
+            author_id__in={author for _, author in parsed},
+        ).values_list('name', 'author_id'))
+        new = [item for key, item in parsed.items() if key not in existing]
+        recipes = Recipe.objects.bulk_create(
+            [recipe for recipe, _, _ in new]
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag)
+            for recipe, (_, tags, _) in zip(recipes, new)
+            for tag in tags
+        )
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(
+                recipe_id=recipe.pk, ingredients_id=ingredient, amount=amount
+            )
+            for recipe, (_, _, ingredients) in zip(recipes, new)
+            for ingredient, amount in ingredients.items()
+        )
+    return index, len(new), len(parsed) - len(new), errors
+
+
+def run_batch(task: tuple) -> tuple[int, int, int, list[str]]:
+    return import_batch(*task)
+
+
+class Command(BaseCommand):
+    help = (
+        'Import recipes from a JSON Lines dump in parallel batches. '
+        'Completed batches are stored in a checkpoint file, so an '
+        'interrupted import can be resumed by running it again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Файл JSONL, рецепт на строку.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Рецептов в одной транзакции.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 1 - без пула.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки, по умолчанию <file>.checkpoint.',
+        )
+
+    def print_to_terminal(self, message):
+        self.stdout.write(self.style.SUCCESS(message))
+
+    @staticmethod
+    def get_batches(file_path: str, batch_size: int) -> list[int]:
+        """Смещения начала каждой пачки строк в файле."""
+        offsets = []
+        with open(file_path, 'rb') as file:
+            line_number = 0
+            offset = 0
+            for line in file:
+                if line_number % batch_size == 0:
+                    offsets.append(offset)
+                offset += len(line)
+                line_number += 1
+        return offsets
+
+    @staticmethod
+    def load_checkpoint(path: str, source: dict) -> set[int]:
+        if not os.path.exists(path):
+            return set()
+        with open(path, encoding='utf-8') as file:
+            checkpoint = json.load(file)
+        if checkpoint['source'] != source:
+            raise CommandError(
+                f'{path} was written for another file or batch size; '
+                'remove it to start over.'
+            )
+        return set(checkpoint['done'])
+
+    @staticmethod
+    def save_checkpoint(path: str, source: dict, done: set[int]) -> None:
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump({'source': source, 'done': sorted(done)}, file)
+        os.replace(temporary_path, path)
+
+    def handle(self, *args, **options):
+        file_path = os.path.abspath(options['file'])
+        batch_size = options['batch_size']
+        checkpoint_path = options['checkpoint'] or f'{file_path}.checkpoint'
+        source = {
+            'file': file_path,
+            'size': os.path.getsize(file_path),
+            'batch_size': batch_size,
+        }
+        done = self.load_checkpoint(checkpoint_path, source)
+        tasks = [
+            (file_path, index, offset, batch_size)
+            for index, offset in enumerate(
+                self.get_batches(file_path, batch_size))
+            if index not in done
+        ]
+        if done:
+            self.print_to_terminal(
+                f'Resuming: {len(done)} batches already imported'
+            )
+        workers = options['workers']
+        if workers > 1 and connections['default'].vendor == 'sqlite':
+            self.stderr.write('SQLite allows one writer, using 1 worker')
+            workers = 1
+        shared_lookups = build_lookups()
+        inserted = skipped = 0
+        errors = []
+        started = perf_counter()
+        if workers > 1:
+            connections.close_all()
+            pool = get_context().Pool(
+                workers, init_worker, (shared_lookups,)
+            )
+            results = pool.imap_unordered(run_batch, tasks)
+        else:
+            pool = None
+            init_worker(shared_lookups)
+            results = map(run_batch, tasks)
+        try:
+            for index, batch_inserted, batch_skipped, batch_errors in results:
+                inserted += batch_inserted
+                skipped += batch_skipped
+                errors.extend(batch_errors)
+                done.add(index)
+                self.save_checkpoint(checkpoint_path, source, done)
+        finally:
+            if pool is not None:
+                pool.terminate()
+        if inserted:
+            bump_version('recipes')
+        elapsed = perf_counter() - started
+        for error in errors[:MAX_ERRORS_SHOWN]:
+            self.stderr.write(error)
+        self.print_to_terminal(
+            f'recipes: {inserted} inserted, {skipped} already existed, '
+            f'{len(errors)} invalid '
+            f'({(inserted + skipped) / elapsed:.0f} recipes/s)'
+        )
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
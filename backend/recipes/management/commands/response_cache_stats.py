@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import (
+    get_response_stats, has_shared_response_stats, reset_response_stats,
+)
+
+CACHED_RESPONSES = ('tags', 'ingredients', 'recipes')
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the API response cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*',
+            help=f'Наборы данных ({", ".join(CACHED_RESPONSES)}), '
+                 'по умолчанию все.',
+        )
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить счётчики.',
+        )
+
+    def handle(self, *args, **options):
+        if not has_shared_response_stats():
+            self.stderr.write(
+                'Counters are kept per process for this cache backend; '
+                'use Redis or Memcached for RESPONSE_CACHE_ALIAS to '
+                'collect them from all workers.'
+            )
+        for name in options['names'] or CACHED_RESPONSES:
+            stats = get_response_stats(name)
+            total = stats['hits'] + stats['misses']
+            ratio = stats['hits'] / total if total else 0
+            self.stdout.write(
+                f'{name}: {stats["hits"]} hits, {stats["misses"]} misses '
+                f'({ratio:.1%} hit rate)'
+            )
+            if options['reset']:
+                reset_response_stats(name)
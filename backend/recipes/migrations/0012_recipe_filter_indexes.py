@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_ingredient_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(
+                fields=['user', 'recipe'], name='recipes_favorite_user_recipe'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='amountingredient',
+            index=models.Index(
+                fields=['ingredients', 'recipe'],
+                name='recipes_amount_ingr_recipe',
+            ),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX recipes_recipe_tags_tag_recipe '
+            'ON recipes_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX recipes_recipe_tags_tag_recipe;',
+        ),
+    ]
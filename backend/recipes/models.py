@@ -1,11 +1,13 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.db.models.functions import Length
-from PIL import Image
 
+from core.tasks import run_in_background
 from core.validators import ColorValidator, ValidateName
+from .images import FORMATS, get_rendition_name, process_recipe_image
 
 User = get_user_model()
 
@@ -118,6 +120,11 @@ class Recipe(models.Model):
         auto_now_add=True,
         editable=False,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+        editable=False,
+    )
     image = models.ImageField(
         verbose_name='Изображение',
     )
@@ -156,6 +163,12 @@ class Recipe(models.Model):
             ),
         )
 
+    @classmethod
+    def from_db(cls, db, field_names, values) -> 'Recipe':
+        instance = super().from_db(db, field_names, values)
+        instance._saved_image = dict(zip(field_names, values)).get('image')
+        return instance
+
     def __str__(self) -> str:
         return f'{self.name}. Автор: {self.author}'
 
@@ -164,10 +177,28 @@ class Recipe(models.Model):
         return super().clean()
 
     def save(self, *args, **kwargs) -> None:
+        image_changed = self._state.adding or (
+            'image' in self.__dict__
+            and self.image.name != getattr(self, '_saved_image', None)
+        )
         super().save(*args, **kwargs)
-        image = Image.open(self.image.path)
-        image.thumbnail((500, 500))
-        image.save(self.image.path)
+        if image_changed and self.image:
+            self._saved_image = self.image.name
+            run_in_background(process_recipe_image, self.pk)
+
+    def get_renditions(self) -> dict[str, dict[str, str]]:
+        """Ссылки на размеры изображения, созданные в фоне."""
+        if not self.image:
+            return {}
+        return {
+            rendition: {
+                extension: default_storage.url(
+                    get_rendition_name(self.image.name, rendition, extension)
+                )
+                for extension in FORMATS
+            }
+            for rendition in settings.RECIPE_IMAGE_RENDITIONS
+        }
 
 
 class AmountIngredient(models.Model):
@@ -212,6 +243,12 @@ class AmountIngredient(models.Model):
                 name='%(app_label)s_%(class)s ingredient alredy added',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('ingredients', 'recipe'),
+                name='recipes_amount_ingr_recipe',
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.amount} {self.ingredients}'
@@ -247,6 +284,11 @@ class Favorite(models.Model):
                 name='\n%(app_label)s_%(class)s recipe is favorite already\n',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('user', 'recipe'), name='recipes_favorite_user_recipe',
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.recipe} в избранном у {self.user}'
@@ -285,3 +327,27 @@ class Basket(models.Model):
 
     def __str__(self) -> str:
         return f'{self.recipe} в списке покупок у {self.user}'
+
+
+class DataVersion(models.Model):
+    """Версия набора данных (время изменения) для сброса кэшей.
+
+    Хранится в БД, чтобы изменения из любого процесса - воркеров,
+    команд импорта - были видны всем остальным.
+    """
+
+    name = models.CharField(
+        verbose_name='Набор данных',
+        max_length=32,
+        unique=True,
+    )
+    version = models.FloatField(
+        verbose_name='Время изменения',
+    )
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self) -> str:
+        return f'{self.name}: {self.version}'
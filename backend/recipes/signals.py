@@ -0,0 +1,58 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.db.transaction import on_commit
+from django.dispatch import receiver
+
+from core.cache import bump_version
+from core.shopping_list import (
+    invalidate_recipes_shopping_lists, invalidate_shopping_lists,
+)
+from .models import AmountIngredient, Basket, Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs) -> None:
+    """Сброс индекса автодополнения ингредиентов."""
+    bump_version('ingredients')
+    recipes_changed()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs) -> None:
+    """Новая версия справочника тэгов."""
+    bump_version('tags')
+    recipes_changed()
+
+
+@receiver((post_save, post_delete), sender=Basket)
+def basket_changed(instance: Basket, **kwargs) -> None:
+    """Сброс кэша списка покупок владельца корзины."""
+    on_commit(partial(invalidate_shopping_lists, [instance.user_id]))
+
+
+@receiver((post_save, post_delete), sender=AmountIngredient)
+def recipe_ingredients_changed(instance: AmountIngredient, **kwargs) -> None:
+    """Сброс кэша списков покупок с этим рецептом."""
+    on_commit(
+        partial(invalidate_recipes_shopping_lists, [instance.recipe_id])
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=AmountIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(**kwargs) -> None:
+    """Сброс кэша ответов с рецептами после фиксации транзакции."""
+    on_commit(partial(bump_version, 'recipes'))
+
+
+@receiver(post_save, sender=User)
+def author_changed(update_fields: frozenset | None = None, **kwargs) -> None:
+    """Данные автора выводятся в рецептах; вход в систему не в счёт."""
+    if update_fields and update_fields <= {'last_login'}:
+        return
+    recipes_changed()